@@ -1,5 +1,6 @@
 import django_filters
 from cf_adverts import models
+from cf_adverts.search import search_adverts
 
 
 class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
@@ -12,6 +13,19 @@ class ProjectFilter(django_filters.FilterSet):
     is_draft = django_filters.BooleanFilter(method='get_is_draft')
     owned = django_filters.BooleanFilter(method='get_owned')
     category = NumberInFilter(name='category', lookup_expr='in')
+    min_percent = django_filters.NumberFilter(name='collected_percent',
+                                              lookup_expr='gte')
+    max_percent = django_filters.NumberFilter(name='collected_percent',
+                                              lookup_expr='lte')
+    ordering = django_filters.OrderingFilter(
+        fields=('collected_percent', 'ended_at', 'created')
+    )
+
+    def __init__(self, data=None, queryset=None, **kwargs):
+        if queryset is not None:
+            queryset = queryset.with_collected_percent()
+        super(ProjectFilter, self).__init__(data=data, queryset=queryset,
+                                            **kwargs)
 
     def get_is_draft(self, queryset, name, value):
         return queryset.exclude(origin_id__isnull=value)
@@ -26,6 +40,51 @@ class ProjectFilter(django_filters.FilterSet):
         fields = ['category', 'status', 'is_draft', 'is_available', 'base_type']
 
 
+class PublishedAdvertSearchFilter(django_filters.FilterSet):
+    """
+    Filters of `ProjectFilter` for search table.
+    Table has only published adverts, so moderation filters
+    keep all rows or return no rows.
+    """
+
+    q = django_filters.CharFilter(method='get_q')
+    is_available = django_filters.NullBooleanFilter(
+        method='get_is_available')
+    is_draft = django_filters.BooleanFilter(method='get_is_draft')
+    base_type = django_filters.CharFilter(method='get_base_type')
+    category = NumberInFilter(name='category', lookup_expr='in')
+    owned = django_filters.BooleanFilter(method='get_owned')
+    min_percent = django_filters.NumberFilter(name='collected_percent',
+                                              lookup_expr='gte')
+    max_percent = django_filters.NumberFilter(name='collected_percent',
+                                              lookup_expr='lte')
+    ordering = django_filters.OrderingFilter(
+        fields=('collected_percent', 'ended_at', 'created')
+    )
+
+    def get_q(self, queryset, name, value):
+        return search_adverts(queryset, value)
+
+    def get_is_available(self, queryset, name, value):
+        return queryset if value else queryset.none()
+
+    def get_is_draft(self, queryset, name, value):
+        return queryset.none() if value else queryset
+
+    def get_base_type(self, queryset, name, value):
+        # adverts have no base type, so no published advert matches
+        return queryset.none()
+
+    def get_owned(self, queryset, name, value):
+        if value:
+            return queryset.filter(owner_id=self.request.user.id)
+        return queryset
+
+    class Meta:
+        model = models.PublishedAdvertSearch
+        fields = ['category', 'status']
+
+
 class ProjectEventFilter(django_filters.FilterSet):
 
     class Meta:
@@ -33,6 +92,15 @@ class ProjectEventFilter(django_filters.FilterSet):
         fields = ('advert',)
 
 
+class EventDailyRollupFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(name='date', lookup_expr='lte')
+
+    class Meta:
+        model = models.EventDailyRollup
+        fields = ('advert', 'date_from', 'date_to')
+
+
 class AdvertEstimateFilter(django_filters.FilterSet):
 
     class Meta:
@@ -0,0 +1,127 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination by unique ordering (keyset).
+    Page is selected with `WHERE (ordering) > (cursor position)`,
+    so it does not need COUNT query and OFFSET scan.
+
+    Ordering should end with unique field and may be overridden
+    by `keyset_ordering` attribute or `get_keyset_ordering` method
+    of the view. Page items may be model instances or `.values()` rows
+    containing ordering columns.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created', 'id')
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering()
+        return getattr(view, 'keyset_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_position_filter(self, position):
+        """
+        Build lexicographic comparison of ordering fields with position.
+
+        :param position: list of ordering field values
+        :return: Q
+        """
+
+        condition, equal_lookups = Q(), {}
+        for field_name, value in zip(self.ordering, position):
+            descending = field_name.startswith('-')
+            field_name = field_name.lstrip('-')
+            lookups = dict(equal_lookups)
+            lookups['{}__{}'.format(field_name,
+                                    'lt' if descending else 'gt')] = value
+            condition |= Q(**lookups)
+            equal_lookups[field_name] = value
+        return condition
+
+    def get_position(self, instance):
+        fields = [self.model._meta.get_field(field_name.lstrip('-'))
+                  for field_name in self.ordering]
+        if isinstance(instance, dict):
+            instance = self.model(**{
+                field.attname: instance[field.attname] for field in fields
+            })
+        return [field.value_to_string(instance) for field in fields]
+
+    def encode_cursor(self, position):
+        data = json.dumps(position).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')).decode(
+                    'utf-8')
+            )
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(
+                    field_name.lstrip('-')).to_python(value)
+                for field_name, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.get_position(self.page[-1]))
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
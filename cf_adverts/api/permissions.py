@@ -4,4 +4,4 @@ from rest_framework.permissions import BasePermission
 class HasEstimatePermission(BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return obj.advert.owner.id == request.user.id
+        return obj.advert.owner_id == request.user.id
@@ -1,4 +1,10 @@
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField, Manager
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
 
 from cf_adverts import models
 
@@ -58,24 +64,6 @@ class EstimateListUpdateSerializer(EstimateDetailSerializer):
 
     id = serializers.IntegerField(required=False)
 
-    def create(self, validated_data):
-        """
-        Would be used for updating/creating objects instead separated methods.
-
-        :param validated_data: dict
-        :return:
-        """
-        instance = None
-        if 'id' in validated_data:
-            instance = self.Meta.model.objects.filter(
-                id=validated_data['id']).last()
-
-        if instance:
-            self.instance = instance
-            return self.update(instance, validated_data)
-        else:
-            return super(EstimateListUpdateSerializer, self).create(validated_data)
-
 
 class AdvertListDetailSerializer(serializers.ModelSerializer):
     class Meta:
@@ -101,6 +89,216 @@ class AdvertListDetailSerializer(serializers.ModelSerializer):
         }
 
 
+def get_request_user(context):
+    return getattr(context.get('request'), 'user', None)
+
+
+class AdvertPermissionsListSerializer(serializers.ListSerializer):
+    """
+    Loads permissions of request user for all adverts with one query.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        data = list(data)
+        user = get_request_user(self.context)
+        if user is not None:
+            models.Advert.prefetch_permissions(data, user)
+        return super(AdvertPermissionsListSerializer, self).to_representation(
+            data)
+
+
+class AdvertOwnerListSerializer(AdvertListDetailSerializer):
+    perms = serializers.SerializerMethodField(read_only=True)
+
+    def get_perms(self, obj):
+        user = get_request_user(self.context)
+        if user is not None:
+            return obj.perms(user)
+
+    class Meta(AdvertListDetailSerializer.Meta):
+        fields = AdvertListDetailSerializer.Meta.fields + ('perms',)
+        list_serializer_class = AdvertPermissionsListSerializer
+
+
+class PublishedAdvertSearchSerializer(serializers.ModelSerializer):
+    """
+    Output is the same as `AdvertListDetailSerializer`.
+    """
+
+    id = serializers.IntegerField(source='pk', read_only=True)
+    get_collected_percent = serializers.IntegerField(
+        source='collected_percent', read_only=True)
+    expired_at = serializers.ReadOnlyField(source='get_expired_at')
+
+    class Meta:
+        model = models.PublishedAdvertSearch
+        fields = AdvertListDetailSerializer.Meta.fields
+
+
+class AdvertValuesSerializer(object):
+    """
+    Read-only fast path of advert list serializers.
+
+    Rows are dicts of `.values(*get_columns(serializer_class))`,
+    columns are converted by fields of `serializer_class` and method
+    sources are computed from columns, so model instances are not built.
+    Output is the same as output of `serializer_class`.
+    `has_draft` source requires `with_draft_flags` annotation.
+    """
+
+    source_columns = {
+        'get_collected_percent': ('collected_amount', 'total_amount'),
+        'get_expired_at': ('ended_at',),
+        'get_small_logo': ('small_logo',),
+        'has_draft': ('draft_exists',),
+        'get_perms': ('id', 'owner'),
+    }
+
+    def __init__(self, instance, serializer_class, context=None):
+        self.instance = instance
+        self.serializer = serializer_class(context=context)
+        self.model = serializer_class.Meta.model
+        self.today = timezone.now().date()
+        self._placeholder = None
+        self.adverts = {}
+        self.getters = [
+            (field.field_name, self.get_getter(field))
+            for field in self.get_readable_fields(self.serializer)
+        ]
+
+    @staticmethod
+    def get_readable_fields(serializer):
+        return [field for field in serializer.fields.values()
+                if not field.write_only]
+
+    @staticmethod
+    def get_source(field):
+        if isinstance(field, serializers.SerializerMethodField):
+            return field.method_name
+        return field.source
+
+    @staticmethod
+    def get_model_field(model, name):
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    @classmethod
+    def get_columns(cls, serializer_class):
+        """
+        Return columns and annotations used by serializer fields.
+
+        :param serializer_class: ModelSerializer class
+        :return: list of str
+        """
+
+        model = serializer_class.Meta.model
+        columns = []
+        for field in cls.get_readable_fields(serializer_class()):
+            source = cls.get_source(field)
+            for name in cls.source_columns.get(source, (source,)):
+                model_field = cls.get_model_field(model, name)
+                column = model_field.attname if model_field else name
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def get_file(self, model_field, name):
+        if self._placeholder is None:
+            # thumbnail aliases are resolved by model of file instance
+            self._placeholder = self.model()
+        return model_field.attr_class(self._placeholder, model_field, name)
+
+    def get_getter(self, field):
+        """
+        Return function converting row to field representation.
+
+        :param field: bound serializer field
+        :return: callable
+        """
+
+        source = self.get_source(field)
+        if isinstance(field, serializers.SerializerMethodField):
+            return getattr(self, source)
+
+        model_field = self.get_model_field(self.model, source)
+        if model_field is None:
+            method = getattr(self, source)
+
+            def get_value(row):
+                value = method(row)
+                return None if value is None else field.to_representation(
+                    value)
+            return get_value
+
+        column = model_field.attname
+        if isinstance(field, RelatedField):
+            return lambda row: None if row[column] is None else \
+                field.to_representation(PKOnlyObject(pk=row[column]))
+        if isinstance(model_field, FileField):
+            return lambda row: field.to_representation(
+                self.get_file(model_field, row[column]))
+        return lambda row: None if row[column] is None else \
+            field.to_representation(row[column])
+
+    def get_collected_percent(self, row):
+        return models.Advert.calculate_percent(row['collected_amount'],
+                                               row['total_amount'])
+
+    def get_expired_at(self, row):
+        if row['ended_at']:
+            return (row['ended_at'] - self.today).days
+        return 0
+
+    def get_small_logo(self, row):
+        if row['small_logo']:
+            model_field = self.model._meta.get_field('small_logo')
+            return self.get_file(model_field,
+                                 row['small_logo'])['small'].url
+
+    def has_draft(self, row):
+        return row['draft_exists']
+
+    def prefetch_permissions(self, rows):
+        """
+        Load permissions of request user for adverts of `rows`
+        with one query, when `perms` field is serialized.
+
+        :param rows: list of dicts
+        :return:
+        """
+
+        user = get_request_user(self.serializer.context)
+        if user is None or 'perms' not in self.serializer.fields:
+            return
+        self.adverts = {
+            row['id']: self.model(id=row['id'], owner_id=row['owner_id'])
+            for row in rows
+        }
+        models.Advert.prefetch_permissions(self.adverts.values(), user)
+
+    def get_perms(self, row):
+        user = get_request_user(self.serializer.context)
+        if user is not None:
+            return self.adverts[row['id']].perms(user)
+
+    def to_representation(self, row):
+        return OrderedDict(
+            (field_name, getter(row)) for field_name, getter in self.getters
+        )
+
+    @property
+    def data(self):
+        rows = list(self.instance)
+        self.prefetch_permissions(rows)
+        return [self.to_representation(row) for row in rows]
+
+
 class AdvertCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Advert
@@ -125,6 +323,20 @@ class AdvertCreateSerializer(serializers.ModelSerializer):
         }
 
 
+class AdvertBatchCreateSerializer(AdvertCreateSerializer):
+    """
+    Files can not be passed in JSON batch,
+    so logos are uploaded later by update.
+    """
+
+    class Meta(AdvertCreateSerializer.Meta):
+        extra_kwargs = dict(
+            AdvertCreateSerializer.Meta.extra_kwargs,
+            logo={'required': False},
+            small_logo={'required': False}
+        )
+
+
 class AdvertUpdateSerializer(serializers.ModelSerializer):
 
     preview = serializers.SerializerMethodField(read_only=True)
@@ -185,11 +397,18 @@ class AdvertUpdateSerializer(serializers.ModelSerializer):
 class AdvertDetailSerializer(serializers.ModelSerializer):
     preview = serializers.SerializerMethodField(read_only=True)
     estimates = EstimateDetailSerializer(many=True, read_only=True)
+    perms = serializers.SerializerMethodField(read_only=True)
 
     def get_preview(self, obj):
         if obj.logo:
             return obj.logo['small'].url
 
+    def get_perms(self, obj):
+        user = get_request_user(self.context)
+        if user is not None:
+            # roles belong to origin of draft
+            return (obj.origin if obj.origin_id else obj).perms(user)
+
     class Meta:
         model = models.Advert
         fields = (
@@ -219,7 +438,8 @@ class AdvertDetailSerializer(serializers.ModelSerializer):
             'extract_from_egrul_approved',
             'general_meeting_decision_approved',
             'expired_at',
-            'estimates'
+            'estimates',
+            'perms'
         )
         extra_kwargs = {
             'draft_status': {'read_only': True, 'source': 'get_draft_status'},
@@ -232,3 +452,23 @@ class ProjectEventSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Event
         fields = ('id', 'base_type', 'percent', 'description', 'created')
+
+
+class EventDailyRollupSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = models.EventDailyRollup
+        fields = (
+            'date',
+            'custom_count',
+            'project_created_count',
+            'project_edited_count',
+            'user_joined_count',
+            'percent_changed_count',
+            'project_done_count',
+            'payment_received_count',
+            'resource_received_count',
+            'max_percent',
+            'first_event_at',
+            'last_event_at',
+        )
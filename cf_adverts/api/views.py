@@ -1,8 +1,22 @@
+import calendar
+import hashlib
+
 from cf_core.models import Status
 from django.db import transaction
+from django.db.models import (
+    Case, Count, F, Max, Value, When, prefetch_related_objects
+)
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import status, mixins
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import APIException
+from rest_framework.permissions import (
+    SAFE_METHODS, IsAdminUser, IsAuthenticated
+)
+from rest_framework.exceptions import (
+    APIException, NotFound, PermissionDenied, ValidationError
+)
 from rest_framework.decorators import detail_route, list_route
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from rest_framework.response import Response
@@ -10,14 +24,22 @@ from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
 from cf_core.api.views import PageNumberPaginator
 
+from cf_adverts.api.pagination import KeysetPagination
 from cf_adverts.api.permissions import HasEstimatePermission
-from .filters import ProjectFilter, ProjectEventFilter, AdvertEstimateFilter
+from cf_adverts.search_cache import search_cache
+from .filters import (
+    ProjectFilter, ProjectEventFilter, AdvertEstimateFilter,
+    EventDailyRollupFilter, PublishedAdvertSearchFilter)
 from .serializers import (
-    AdvertDetailSerializer, AdvertUpdateSerializer, AdvertListDetailSerializer,
-    AdvertCreateSerializer, ProjectEventSerializer,
+    AdvertDetailSerializer, AdvertUpdateSerializer, AdvertOwnerListSerializer,
+    AdvertBatchCreateSerializer, AdvertCreateSerializer,
+    AdvertValuesSerializer, ProjectEventSerializer,
     EstimateCreateSerializer, EstimateListUpdateSerializer,
-    EstimateDetailSerializer)
-from ..models import AdvertEstimate, Event, PublishedAdvert, Advert
+    EstimateDetailSerializer, EventDailyRollupSerializer,
+    PublishedAdvertSearchSerializer)
+from ..models import (
+    AdvertEstimate, Event, EventDailyRollup, PublishedAdvertSearch, Advert
+)
 
 
 class SerializerSchemaMixin(object):
@@ -41,7 +63,104 @@ class SerializerSchemaMixin(object):
         return serializer_class
 
 
-class AdvertViewSet(SerializerSchemaMixin, ModelViewSet):
+class OnlySerializerFieldsMixin(object):
+    """
+    Mixin for loading only columns used by serializer.
+    Sources which are not model fields (methods, properties)
+    are mapped to columns by `only_fields_dependencies`.
+    """
+
+    only_fields_dependencies = {}
+
+    def get_only_fields(self, model, serializer_class=None):
+        """
+        Return model fields names used by serializer fields.
+
+        :param model: model class
+        :param serializer_class: serializer class, by default
+            serializer class of current action
+        :return: list of str
+        """
+
+        serializer_class = serializer_class or self.get_serializer_class()
+        model_fields = {field.name for field in model._meta.concrete_fields}
+        only_fields = set()
+        for field in serializer_class().fields.values():
+            sources = self.only_fields_dependencies.get(field.source,
+                                                        (field.source,))
+            only_fields.update(name for name in sources
+                               if name in model_fields)
+        return sorted(only_fields)
+
+
+class ConditionalRequestMixin(object):
+    """
+    Mixin for conditional requests by `ETag` and `Last-Modified`.
+    GET returns 304 if resource is not modified,
+    PUT/PATCH return 412 if client version is outdated.
+    """
+
+    @staticmethod
+    def build_validators(*parts):
+        """
+        Return ETag and last modification time.
+
+        :param parts: values identifying resource version,
+            datetime values are used for last modification time
+        :return: tuple (str, datetime or None)
+        """
+
+        dates = [part for part in parts if hasattr(part, 'utctimetuple')]
+        digest = hashlib.md5(
+            ':'.join(str(part) for part in parts).encode('utf-8')
+        ).hexdigest()
+        return '"{}"'.format(digest), max(dates) if dates else None
+
+    precondition_headers = ('HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE',
+                            'HTTP_IF_NONE_MATCH')
+
+    def has_preconditions(self, request):
+        return any(header in request.META
+                   for header in self.precondition_headers)
+
+    @staticmethod
+    def get_conditional_response(request, etag, last_modified):
+        timestamp = None
+        if last_modified is not None:
+            timestamp = calendar.timegm(last_modified.utctimetuple())
+        return get_conditional_response(request, etag=etag,
+                                        last_modified=timestamp)
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(
+                calendar.timegm(last_modified.utctimetuple()))
+        return response
+
+
+class CursorPaginationMixin(object):
+    """
+    Mixin paging by `pagination_class` by default and switching
+    to `KeysetPagination` when `cursor` param is passed.
+    """
+
+    def is_cursor_mode(self):
+        return KeysetPagination.cursor_query_param in self.request.query_params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if self.is_cursor_mode():
+                pagination_class = KeysetPagination
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+
+
+class AdvertViewSet(SerializerSchemaMixin, ConditionalRequestMixin,
+                    CursorPaginationMixin, ModelViewSet):
     model = Advert
     serializer_class = AdvertDetailSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -52,25 +171,100 @@ class AdvertViewSet(SerializerSchemaMixin, ModelViewSet):
         'create': AdvertCreateSerializer,
         'retrieve': AdvertDetailSerializer,
         'update': AdvertUpdateSerializer,
-        'search': AdvertListDetailSerializer,
-        'list': AdvertListDetailSerializer,
+        'search': PublishedAdvertSearchSerializer,
+        'list': AdvertOwnerListSerializer,
+        'batch': AdvertBatchCreateSerializer,
     }
+    batch_max_size = 1000
+    search_keyset_ordering = ('-advert',)
+    search_keyset_fields = ('collected_percent', 'created')
 
     def get_object(self):
+        """
+        Reads return existing draft of available advert or advert itself,
+        draft is created by first changing request.
+        """
+
         obj = super(AdvertViewSet, self).get_object()
+        if self.request.method in SAFE_METHODS:
+            return self.get_current_version(obj)
+        return self.get_editable_version(obj)
+
+    @staticmethod
+    def get_current_version(obj):
         if obj.is_available:
-            if not obj.has_draft() and self.action == 'destroy':
-                return obj
-            draft = obj.get_draft()
-            if draft and draft.process_status != \
-                    Advert.MODERATE_PROCESS_TYPES.DONE:
-                raise self.permission_denied(
-                    self.request,
-                    _('Advert still is in moderation')
-                )
-            obj = obj.get_or_create_draft()
+            return obj.get_draft() or obj
         return obj
 
+    def get_editable_version(self, obj):
+        if not obj.is_available:
+            return obj
+        draft = obj.get_draft()
+        if draft is None and self.action == 'destroy':
+            return obj
+        if draft and draft.process_status != \
+                Advert.MODERATE_PROCESS_TYPES.DONE:
+            raise self.permission_denied(
+                self.request,
+                _('Advert still is in moderation')
+            )
+        return draft or obj.get_or_create_draft()
+
+    def get_validators(self, obj):
+        """
+        Validators of advert version depend on its estimates and
+        permissions of request user, which are returned by detail.
+        """
+
+        # roles belong to origin of draft
+        perms = (obj.origin if obj.origin_id else obj).perms(
+            self.request.user)
+        if 'estimates' in getattr(obj, '_prefetched_objects_cache', {}):
+            modified = [estimate.modified for estimate in obj.estimates.all()]
+            estimates = {
+                'last_modified': max(modified) if modified else None,
+                'count': len(modified)
+            }
+        else:
+            estimates = AdvertEstimate.objects.filter(
+                advert_id=obj.id).aggregate(
+                last_modified=Max('modified'),
+                count=Count('id')
+            )
+        return self.build_validators(obj.id, obj.modified,
+                                     estimates['last_modified'] or '',
+                                     estimates['count'],
+                                     sorted(perms.items()))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_validators(instance)
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is None:
+            prefetch_related_objects([instance], 'estimates')
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        return self.set_validators(response, etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        obj = super(AdvertViewSet, self).get_object()
+        if self.has_preconditions(request):
+            # client validators belong to version returned by reads
+            response = self.get_conditional_response(
+                request, *self.get_validators(self.get_current_version(obj)))
+            if response is not None:
+                return response
+
+        instance = self.get_editable_version(obj)
+
+        serializer = self.get_serializer(instance, data=request.data,
+                                         partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return self.set_validators(Response(serializer.data),
+                                   *self.get_validators(serializer.instance))
+
     @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(
@@ -83,7 +277,47 @@ class AdvertViewSet(SerializerSchemaMixin, ModelViewSet):
         serializer.save()
 
     def get_queryset(self):
-        return self.model.objects.filter(owner_id=self.request.user.id)
+        """
+        Detail actions load draft in the same query.
+        List queryset is not narrowed by `.only()`: `list` reads it
+        through `get_values_response`, whose `.values()` selects
+        the same serializer columns without building instances.
+        """
+
+        queryset = self.model.objects.filter(owner_id=self.request.user.id)
+        if self.action == 'list':
+            return queryset
+        return queryset.with_draft_flags().select_related('draft')
+
+    def get_values_serializer(self, rows):
+        return AdvertValuesSerializer(
+            rows,
+            serializer_class=self.get_serializer_class(),
+            context=self.get_serializer_context()
+        )
+
+    def get_values_response(self, queryset, extra_columns=()):
+        """
+        Paginated response built by `AdvertValuesSerializer`.
+
+        :param queryset: filtered queryset
+        :param extra_columns: columns loaded for pagination
+        :return: response data
+        """
+
+        columns = AdvertValuesSerializer.get_columns(
+            self.get_serializer_class())
+        rows = queryset.values(*columns + [
+            column for column in extra_columns if column not in columns])
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_values_serializer(page).data).data
+        return self.get_values_serializer(rows).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.get_values_response(queryset))
 
     @detail_route(methods=['post'])
     def send_to_moderation(self, request, pk):
@@ -104,26 +338,170 @@ class AdvertViewSet(SerializerSchemaMixin, ModelViewSet):
         obj.save(update_fields=['process_status', 'modified'])
         return Response(status=status.HTTP_200_OK)
 
+    def is_cursor_mode(self):
+        """
+        Only search switches to `KeysetPagination`.
+        """
+
+        return self.action == 'search' and \
+            super(AdvertViewSet, self).is_cursor_mode()
+
+    def get_keyset_ordering(self):
+        """
+        Ordering of search cursor pages. Only `ordering` by one column
+        of `search_keyset_fields` is applied, advert id breaks ties.
+        """
+
+        ordering = self.request.query_params.get('ordering', '')
+        if ordering.lstrip('-') in self.search_keyset_fields:
+            return (ordering,) + self.search_keyset_ordering
+        return self.search_keyset_ordering
+
     @list_route(methods=['get'], permission_classes=())
     def search(self, request):
         """
         Search published adverts.
+        Reads denormalized `PublishedAdvertSearch` table,
+        responses are cached until any advert is changed.
+        Pass `cursor` param (empty for first page) to walk
+        pages by cursor without COUNT and OFFSET.
         """
 
-        queryset = self.filter_queryset(
-            PublishedAdvert.objects.all()
+        data = search_cache.get_or_build(
+            request,
+            lambda: self.get_search_data(request)
         )
+        return Response(data)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+    def get_search_data(self, request):
+        queryset = PublishedAdvertSearchFilter(
+            request.query_params,
+            queryset=PublishedAdvertSearch.objects.order_by('-pk'),
+            request=request
+        ).qs
+
+        extra_columns = ()
+        if self.is_cursor_mode():
+            extra_columns = [
+                PublishedAdvertSearch._meta.get_field(
+                    field_name.lstrip('-')).attname
+                for field_name in self.get_keyset_ordering()
+            ]
+        return self.get_values_response(queryset, extra_columns)
+
+    @staticmethod
+    def get_batch_item_id(item):
+        try:
+            return int(item['id'])
+        except (KeyError, TypeError, ValueError):
+            return None
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+    def get_batch_serializer(self, item, advert=None):
+        """
+        Return serializer of batch item.
+
+        :param item: dict
+        :param advert: updated Advert instance or None for new advert
+        :return: serializer instance
+        """
+
+        context = self.get_serializer_context()
+        if advert is None:
+            return AdvertBatchCreateSerializer(data=item, context=context)
+        return AdvertUpdateSerializer(self.get_current_version(advert),
+                                      data=item, partial=True,
+                                      context=context)
 
+    @list_route(methods=['post'])
+    def batch(self, request):
+        """
+        Create and update many adverts in one transaction.
+        Items with `id` update owned adverts, another items create adverts,
+        new adverts are inserted with bulk queries.
+        Response contains `status` and `data` or `errors` of every item.
+        """
 
-class EstimateViewSet(SerializerSchemaMixin, ModelViewSet):
+        items = request.data
+        if not isinstance(items, list) or len(items) > self.batch_max_size:
+            raise ValidationError(
+                _('Expected a list of at most {} items').format(
+                    self.batch_max_size)
+            )
+        adverts = self.get_queryset().in_bulk(
+            {self.get_batch_item_id(item) for item in items
+             if isinstance(item, dict)} - {None}
+        )
+
+        results, created, updated, updated_ids = [], [], [], set()
+        for index, item in enumerate(items):
+            advert = None
+            if isinstance(item, dict) and item.get('id') is not None:
+                advert = adverts.get(self.get_batch_item_id(item))
+                if advert is None:
+                    results.append({
+                        'status': status.HTTP_404_NOT_FOUND,
+                        'errors': {'id': [NotFound.default_detail]}
+                    })
+                    continue
+                if advert.id in updated_ids:
+                    # second draft of the same advert can not be created
+                    results.append({
+                        'status': status.HTTP_400_BAD_REQUEST,
+                        'errors': {'id': [_('Duplicate advert in batch')]}
+                    })
+                    continue
+                updated_ids.add(advert.id)
+            serializer = self.get_batch_serializer(item, advert)
+            if not serializer.is_valid():
+                results.append({'status': status.HTTP_400_BAD_REQUEST,
+                                'errors': serializer.errors})
+                continue
+            results.append(None)
+            if advert is None:
+                created.append((index, serializer))
+            else:
+                updated.append((index, serializer, advert))
+
+        with transaction.atomic():
+            self.perform_batch_create(
+                [serializer for index, serializer in created])
+            for index, serializer in created:
+                results[index] = {'status': status.HTTP_201_CREATED,
+                                  'data': serializer.data}
+            for index, serializer, advert in updated:
+                try:
+                    serializer.instance = self.get_editable_version(advert)
+                except PermissionDenied as exc:
+                    results[index] = {'status': exc.status_code,
+                                      'errors': {'id': [exc.detail]}}
+                    continue
+                serializer.save()
+                results[index] = {'status': status.HTTP_200_OK,
+                                  'data': serializer.data}
+        return Response(results)
+
+    def perform_batch_create(self, serializers):
+        advert_status = Status.get_for_model(self.model).first()
+        adverts = [
+            self.model(owner_id=self.request.user.id, status=advert_status,
+                       **serializer.validated_data)
+            for serializer in serializers
+        ]
+        self.model.objects.bulk_create_adverts(adverts)
+        for serializer, advert in zip(serializers, adverts):
+            serializer.instance = advert
+
+    @list_route(methods=['get'], permission_classes=(IsAdminUser,))
+    def search_cache_stats(self, request):
+        """
+        Hit ratio of search responses cache.
+        """
+
+        return Response(search_cache.get_stats())
+
+
+class EstimateViewSet(SerializerSchemaMixin, ConditionalRequestMixin,
+                      ModelViewSet):
     permission_classes = (IsAuthenticated, HasEstimatePermission)
     serializer_class = EstimateDetailSerializer
     queryset = AdvertEstimate.objects.all()
@@ -135,20 +513,167 @@ class EstimateViewSet(SerializerSchemaMixin, ModelViewSet):
         'list_update': EstimateListUpdateSerializer
     }
 
+    def list(self, request, *args, **kwargs):
+        estimates = self.filter_queryset(self.get_queryset()).aggregate(
+            last_modified=Max('modified'),
+            count=Count('id')
+        )
+        etag, last_modified = self.build_validators(
+            estimates['last_modified'] or '', estimates['count'])
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is None:
+            response = super(EstimateViewSet, self).list(request, *args,
+                                                         **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def get_list_update_advert(self):
+        advert_id = self.request.query_params.get('advert')
+        if not advert_id:
+            return None
+        try:
+            advert = Advert.objects.filter(pk=int(advert_id)).first()
+        except ValueError:
+            advert = None
+        if advert is None:
+            raise NotFound()
+        if advert.owner_id != self.request.user.id:
+            self.permission_denied(self.request)
+        return advert
+
+    def get_list_update_estimates(self, items, advert=None):
+        """
+        Load estimates referenced by items with one query
+        and check permissions of every estimate.
+
+        :param items: validated items
+        :param advert: Advert instance passed by `advert` param or None
+        :return: dict {id: AdvertEstimate}
+        """
+
+        ids = {item['id'] for item in items if item.get('id') is not None}
+        estimates = AdvertEstimate.objects.select_related('advert').in_bulk(
+            ids)
+        if len(estimates) != len(ids):
+            raise NotFound()
+        for estimate in estimates.values():
+            self.check_object_permissions(self.request, estimate)
+            if advert is not None and estimate.advert_id != advert.id:
+                self.permission_denied(self.request)
+        return estimates
+
+    def perform_list_update(self, items, estimates, advert=None,
+                            delete_missing=False):
+        """
+        Update changed estimates with one query, create new ones
+        with bulk query and delete estimates of advert missing
+        in items if asked.
+
+        :return: list of estimates in items order
+        """
+
+        result, created, changes = [], [], {}
+        for item in items:
+            if item.get('id') is None:
+                estimate = AdvertEstimate(advert=advert, **item)
+                created.append(estimate)
+            else:
+                estimate = estimates[item['id']]
+                for field_name, value in item.items():
+                    if getattr(estimate, field_name) != value:
+                        setattr(estimate, field_name, value)
+                        changes.setdefault(field_name, {})[estimate.pk] = value
+            result.append(estimate)
+
+        if changes:
+            self.bulk_update_estimates(changes)
+
+        if transaction.get_connection().features.\
+                can_return_ids_from_bulk_insert:
+            AdvertEstimate.objects.bulk_create(created)
+        else:
+            for estimate in created:
+                estimate.save()
+
+        if delete_missing:
+            advert.estimates.exclude(
+                pk__in=[estimate.pk for estimate in result]).delete()
+        return result
+
+    @staticmethod
+    def bulk_update_estimates(changes):
+        """
+        Write changed values of many estimates with one UPDATE,
+        every changed column is set by `CASE WHEN id = ...`.
+
+        :param changes: dict {field name: {estimate id: value}}
+        """
+
+        update_kwargs, changed_ids = {}, set()
+        for field_name, values in changes.items():
+            field = AdvertEstimate._meta.get_field(field_name)
+            update_kwargs[field_name] = Case(
+                *[When(pk=pk, then=Value(value, output_field=field))
+                  for pk, value in values.items()],
+                default=F(field_name),
+                output_field=field
+            )
+            changed_ids.update(values)
+        AdvertEstimate.objects.filter(pk__in=changed_ids).update(
+            modified=timezone.now(), **update_kwargs)
+
     @list_route(methods=['post'])
     def list_update(self, request):
         """
         Update advert estimates.
+        Items without `id` are created for advert from `advert` param.
+        With `delete_missing` param estimates of the advert missing
+        in the list are deleted.
         """
         serializer = self.get_serializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        items = serializer.validated_data
+
+        advert = self.get_list_update_advert()
+        delete_missing = request.query_params.get('delete_missing') in (
+            '1', 'true', 'True')
+        if advert is None and (delete_missing or any(
+                item.get('id') is None for item in items)):
+            raise ValidationError({
+                'advert': [_('Advert param is required to create '
+                             'or delete estimates')]
+            })
+
+        estimates = self.get_list_update_estimates(items, advert)
+        with transaction.atomic():
+            result = self.perform_list_update(items, estimates, advert,
+                                              delete_missing)
+        return Response(self.get_serializer(result, many=True).data)
 
 
-class EventsViewSet(GenericViewSet, mixins.ListModelMixin):
+class EventsViewSet(OnlySerializerFieldsMixin, CursorPaginationMixin,
+                    GenericViewSet, mixins.ListModelMixin):
+    """
+    Events of adverts paged by page number,
+    `cursor` param switches to keyset pages.
+    """
+
     pagination_class = PageNumberPaginator
+    keyset_ordering = ('-created', 'id')
     filter_backends = (DjangoFilterBackend,)
     filter_class = ProjectEventFilter
     queryset = Event.objects.all()
     serializer_class = ProjectEventSerializer
+
+    def get_queryset(self):
+        return self.queryset.only(*self.get_only_fields(Event))
+
+
+class EventRollupsViewSet(GenericViewSet, mixins.ListModelMixin):
+    """
+    Daily events statistics of advert.
+    """
+
+    filter_backends = (DjangoFilterBackend,)
+    filter_class = EventDailyRollupFilter
+    queryset = EventDailyRollup.objects.all()
+    serializer_class = EventDailyRollupSerializer
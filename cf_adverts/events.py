@@ -0,0 +1,164 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from cf_adverts.models.event import Event, EventDailyRollup
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'EventBuffer',
+    'event_buffer'
+]
+
+
+class EventBatch(object):
+    """
+    Events collected in one transaction savepoint.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.events = []
+
+    def flush(self):
+        events, self.events = self.events, []
+        self.buffer.write(events)
+
+
+class EventBuffer(object):
+    """
+    Collect events and write them with `bulk_create`.
+
+    Inside transaction events are written on commit or as soon as
+    `max_size` events are collected. Outside transaction events are
+    written immediately unless buffer is used as context manager:
+
+        with event_buffer:
+            ...
+
+    With `use_celery` events are not written in the process, but sent
+    after commit to `create_events` task as compact payloads.
+    """
+
+    def __init__(self, max_size=100, use_celery=False):
+        self.max_size = max_size
+        self.use_celery = use_celery
+        self._local = threading.local()
+
+    @property
+    def batches(self):
+        if not hasattr(self._local, 'batches'):
+            self._local.batches = {}
+        return self._local.batches
+
+    def __enter__(self):
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._local.depth -= 1
+        if not self._local.depth:
+            self.flush()
+
+    @staticmethod
+    def is_registered(connection, batch):
+        return any(func == batch.flush
+                   for sids, func in connection.run_on_commit)
+
+    def get_live_batches(self):
+        """
+        Drop batches of committed or rolled back transactions.
+
+        :return: dict {savepoint ids: EventBatch}
+        """
+
+        connection = transaction.get_connection()
+        batches = self.batches
+        for key, batch in list(batches.items()):
+            if key is not None and not self.is_registered(connection, batch):
+                del batches[key]
+        return batches
+
+    def get_batch(self):
+        """
+        Return batch for current savepoint.
+        Batches of rolled back savepoints are dropped.
+
+        :return: EventBatch instance
+        """
+
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            key = None
+        else:
+            key = tuple(connection.savepoint_ids)
+
+        batches = self.get_live_batches()
+        batch = batches.get(key)
+        if batch is None:
+            batch = batches[key] = EventBatch(self)
+            if key is not None:
+                transaction.on_commit(batch.flush)
+        return batch
+
+    def add(self, **event_kwargs):
+        batch = self.get_batch()
+        batch.events.append(Event(**event_kwargs))
+        if len(batch.events) >= self.max_size or (
+                not getattr(self._local, 'depth', 0) and
+                not transaction.get_connection().in_atomic_block):
+            batch.flush()
+
+    def flush(self):
+        for batch in list(self.get_live_batches().values()):
+            batch.flush()
+
+    @staticmethod
+    def get_payload(event):
+        return {
+            'advert_id': event.advert_id,
+            'base_type': event.base_type,
+            'description': str(event.description),
+            'percent': event.percent,
+            'created': event.created.isoformat()
+        }
+
+    def send(self, events):
+        from cf_adverts.tasks import create_events
+
+        payloads = [self.get_payload(event) for event in events]
+        transaction.on_commit(
+            lambda: create_events.apply_async(args=[payloads])
+        )
+
+    def write(self, events):
+        if not events:
+            return
+        if self.use_celery:
+            self.send(events)
+            return
+        Event.objects.bulk_create(events)
+        EventDailyRollup.objects.add_events(events)
+        if logger.isEnabledFor(logging.INFO):
+            for event in events:
+                logger.info(
+                    "New event #%s. Type: '%s'. Advert: %s. "
+                    "Description: %s. Percent: %s",
+                    event.pk, event.base_type, event.advert_id,
+                    event.description, event.percent,
+                    extra={
+                        'event_id': event.pk,
+                        'event_type': event.base_type,
+                        'advert_id': event.advert_id,
+                        'percent': event.percent
+                    }
+                )
+
+
+event_buffer = EventBuffer(
+    max_size=getattr(settings, 'ADVERTS_EVENT_BUFFER_SIZE', 100),
+    use_celery=getattr(settings, 'ADVERTS_EVENTS_ASYNC', False)
+)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from cf_adverts.retention import EventRetentionPolicy, process_events_retention
+
+
+class Command(BaseCommand):
+    help = 'Compact redundant advert events and archive old events ' \
+           'of finished adverts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Only report events to process.')
+        parser.add_argument('--compact-window', type=int, default=None,
+                            help='Max seconds between merged events.')
+        parser.add_argument('--archive-after-days', type=int, default=None,
+                            help='Age of archived events.')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows processed in one transaction.')
+
+    def handle(self, *args, **options):
+        policy = EventRetentionPolicy.from_settings(
+            compact_window=options['compact_window'],
+            archive_after_days=options['archive_after_days'],
+            chunk_size=options['chunk_size']
+        )
+        report = process_events_retention(policy, dry_run=options['dry_run'])
+        self.stdout.write(
+            'Compacted events: {compacted}. '
+            'Archived events: {archived}. '
+            'Dry run: {dry_run}.'.format(**report)
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from cf_adverts.models import PublishedAdvertSearch
+
+
+class Command(BaseCommand):
+    help = 'Rebuild published adverts search table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Adverts loaded in one query.')
+
+    def handle(self, *args, **options):
+        total = PublishedAdvertSearch.objects.rebuild(
+            chunk_size=options['chunk_size'])
+        self.stdout.write('Indexed adverts: {total}.'.format(total=total))
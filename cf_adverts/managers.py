@@ -1,7 +1,20 @@
-from django.db import models
+import threading
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import functions
+from django.utils import timezone
+from model_utils import Choices
 
 from cf_core import managers
 from cf_users.models import Profile
+from cf_adverts.search import get_document_terms
+
+MODERATION_STATE_CHOICES = Choices(
+    ('DRAFT', 'draft'),
+    ('NEW', 'new'),
+    ('BANNED', 'banned'),
+)
 
 
 class ProjectQuerySet(managers.ModerateQuerySet):
@@ -15,7 +28,136 @@ class ProjectQuerySet(managers.ModerateQuerySet):
         return super(ProjectQuerySet, self).banned().filter(origin=None)
 
     def drafts(self):
-        return super(ProjectQuerySet, self).exclude(origin=None)
+        return self.filter(origin__isnull=False)
+
+    def with_collected_percent(self):
+        """
+        Annotate `collected_percent` calculated in the database.
+        Result is the same as `Advert.get_collected_percent`.
+        """
+
+        return self.annotate(collected_percent=models.Case(
+            models.When(total_amount=0, then=models.Value(0)),
+            default=models.ExpressionWrapper(
+                models.F('collected_amount') * 100 / models.F('total_amount'),
+                output_field=models.BigIntegerField()
+            ),
+            output_field=models.BigIntegerField()
+        ))
+
+    def apply_payments(self, payments):
+        """
+        Increment `collected_amount` of adverts with payment amounts.
+        Amounts are summed per advert and applied with F-expression updates,
+        so concurrent payments are never lost.
+
+        :param payments: iterable of (advert id, amount) pairs
+        :return: dict {advert id: (old percent, new percent)}
+        """
+
+        deltas = defaultdict(int)
+        for advert_id, amount in payments:
+            deltas[advert_id] += amount
+        deltas = {
+            advert_id: amount for advert_id, amount in deltas.items() if amount
+        }
+        if not deltas:
+            return {}
+
+        now = timezone.now()
+        with transaction.atomic():
+            # fixed order of row locks prevents deadlocks between batches
+            for advert_id in sorted(deltas):
+                self.filter(pk=advert_id).update(
+                    collected_amount=models.F('collected_amount') +
+                    deltas[advert_id],
+                    modified=now
+                )
+            rows = list(self.filter(pk__in=list(deltas)).values_list(
+                'pk', 'collected_amount', 'total_amount'))
+
+        from cf_adverts.signals import projects_updated
+        projects_updated.send(sender=self.model, advert_ids=list(deltas))
+
+        calculate_percent = self.model.calculate_percent
+        return {
+            advert_id: (
+                calculate_percent(collected_amount - deltas[advert_id],
+                                  total_amount),
+                calculate_percent(collected_amount, total_amount)
+            )
+            for advert_id, collected_amount, total_amount in rows
+        }
+
+    def bulk_create_adverts(self, adverts, batch_size=500):
+        """
+        Insert new adverts with bulk queries in one transaction.
+        Owner profile type is filled as in `Advert.save`, `project_created`
+        is sent for every advert and its events are written together.
+        Databases which can not return ids of inserted rows fall back
+        to `save()` of every advert.
+
+        :param adverts: list of unsaved Advert instances
+        :param batch_size: rows inserted by one query
+        :return: list of saved adverts
+        """
+
+        from cf_adverts.events import event_buffer
+        from cf_adverts.signals import project_created
+
+        profile_types = dict(Profile.objects.filter(
+            user_id__in={advert.owner_id for advert in adverts}
+        ).values_list('user_id', 'base_type'))
+        for advert in adverts:
+            advert.owner_profile_type = profile_types.get(advert.owner_id, '')
+
+        with transaction.atomic(using=self.db), event_buffer:
+            connection = transaction.get_connection(self.db)
+            if not connection.features.can_return_ids_from_bulk_insert:
+                for advert in adverts:
+                    advert.save(using=self.db)
+                return adverts
+
+            self.bulk_create(adverts, batch_size=batch_size)
+            for advert in adverts:
+                advert._snapshot_loaded_values()
+                project_created.send(sender=advert)
+        return adverts
+
+    def with_draft_flags(self):
+        """
+        Annotate `draft_exists` used by `Advert.has_draft`
+        instead of separated query per row.
+        """
+
+        drafts = models.QuerySet(self.model).filter(
+            origin_id=models.OuterRef('pk'))
+        return self.annotate(draft_exists=models.Exists(drafts))
+
+    def with_moderation_state(self):
+        """
+        Annotate `moderation_state` with the proxy state of the row:
+        draft, new, banned or empty string for another adverts.
+        Conditions mirror draft, wait and banned proxy managers.
+        """
+
+        is_nco = models.Q(owner_profile_type=Profile.TYPE_CHOICES.NCO)
+        return self.annotate(moderation_state=models.Case(
+            models.When(
+                ~models.Q(origin=None) & is_nco,
+                then=models.Value(MODERATION_STATE_CHOICES.DRAFT)
+            ),
+            models.When(
+                models.Q(origin=None, is_available=None) & is_nco,
+                then=models.Value(MODERATION_STATE_CHOICES.NEW)
+            ),
+            models.When(
+                models.Q(origin=None, is_available=False),
+                then=models.Value(MODERATION_STATE_CHOICES.BANNED)
+            ),
+            default=models.Value(''),
+            output_field=models.CharField()
+        ))
 
 
 class ModerateManager(models.Manager):
@@ -36,17 +178,33 @@ class ProjectManager(ModerateManager):
     def get_queryset(self):
         return ProjectQuerySet(self.model, using=self.db)
 
+    def apply_payments(self, payments):
+        return self.get_queryset().apply_payments(payments)
+
+    def bulk_create_adverts(self, adverts, batch_size=500):
+        return self.get_queryset().bulk_create_adverts(adverts,
+                                                       batch_size=batch_size)
+
+    def with_collected_percent(self):
+        return self.get_queryset().with_collected_percent()
+
+    def with_draft_flags(self):
+        return self.get_queryset().with_draft_flags()
+
+    def with_moderation_state(self):
+        return self.get_queryset().with_moderation_state()
+
 
 class PublishedAdvertManager(models.Manager):
     def get_queryset(self):
         return ProjectQuerySet(self.model, using=self.db).allowed().filter(
-            owner__profile__base_type=Profile.TYPE_CHOICES.NCO)
+            owner_profile_type=Profile.TYPE_CHOICES.NCO)
 
 
 class WaitAdvertManager(models.Manager):
     def get_queryset(self):
         return ProjectQuerySet(self.model, using=self.db).waiting().filter(
-            owner__profile__base_type=Profile.TYPE_CHOICES.NCO)
+            owner_profile_type=Profile.TYPE_CHOICES.NCO)
 
 
 class BannedProjectManager(models.Manager):
@@ -57,4 +215,230 @@ class BannedProjectManager(models.Manager):
 class DraftProjectManager(models.Manager):
     def get_queryset(self):
         return ProjectQuerySet(self.model, using=self.db).drafts().filter(
-            owner__profile__base_type=Profile.TYPE_CHOICES.NCO)
+            owner_profile_type=Profile.TYPE_CHOICES.NCO)
+
+
+class EventDailyRollupManager(models.Manager):
+    def get_rollup_values(self, events):
+        """
+        Aggregate events by advert and local date.
+
+        :param events: iterable of Event instances
+        :return: dict {(advert id, date): dict of rollup values}
+        """
+
+        rollups = {}
+        for event in events:
+            created = timezone.localtime(event.created)
+            values = rollups.setdefault((event.advert_id, created.date()), {
+                'counts': defaultdict(int),
+                'max_percent': event.percent,
+                'first_event_at': event.created,
+                'last_event_at': event.created
+            })
+            values['counts'][self.model.get_count_field(event.base_type)] += 1
+            values['max_percent'] = max(values['max_percent'], event.percent)
+            values['first_event_at'] = min(values['first_event_at'],
+                                           event.created)
+            values['last_event_at'] = max(values['last_event_at'],
+                                          event.created)
+        return rollups
+
+    def add_events(self, events):
+        """
+        Incrementally update rollups with new events.
+
+        :param events: iterable of Event instances
+        :return:
+        """
+
+        rollups = self.get_rollup_values(events)
+        with transaction.atomic():
+            for (advert_id, date), values in sorted(rollups.items()):
+                defaults = dict(
+                    values['counts'],
+                    max_percent=values['max_percent'],
+                    first_event_at=values['first_event_at'],
+                    last_event_at=values['last_event_at']
+                )
+                rollup, created = self.get_or_create(
+                    advert_id=advert_id,
+                    date=date,
+                    defaults=defaults
+                )
+                if created:
+                    continue
+                update_kwargs = {
+                    field_name: models.F(field_name) + count
+                    for field_name, count in values['counts'].items()
+                }
+                self.filter(pk=rollup.pk).update(
+                    max_percent=functions.Greatest(
+                        'max_percent',
+                        models.Value(values['max_percent'],
+                                     output_field=models.IntegerField())),
+                    first_event_at=functions.Least(
+                        'first_event_at',
+                        models.Value(values['first_event_at'],
+                                     output_field=models.DateTimeField())),
+                    last_event_at=functions.Greatest(
+                        'last_event_at',
+                        models.Value(values['last_event_at'],
+                                     output_field=models.DateTimeField())),
+                    **update_kwargs
+                )
+
+    def rebuild(self, events, keep_count_fields=()):
+        """
+        Rebuild rollups of days covered by events.
+        Rollups of days without source events are kept, so counts of
+        deleted events are not lost. Counts of `keep_count_fields` are
+        never lowered, because retention may merge events of these types.
+
+        :param events: iterable of Event or ArchivedEvent instances
+        :param keep_count_fields: names of count fields
+        :return: int, number of rollups
+        """
+
+        rollups = self.get_rollup_values(events)
+        if not rollups:
+            return 0
+
+        with transaction.atomic():
+            existing = {
+                (rollup.advert_id, rollup.date): rollup
+                for rollup in self.select_for_update().filter(
+                    advert_id__in={advert_id for advert_id, date in rollups},
+                    date__in={date for advert_id, date in rollups}
+                )
+            }
+            existing = {key: rollup for key, rollup in existing.items()
+                        if key in rollups}
+            for key, rollup in existing.items():
+                counts = rollups[key]['counts']
+                for field_name in keep_count_fields:
+                    counts[field_name] = max(counts[field_name],
+                                             getattr(rollup, field_name))
+
+            self.filter(
+                pk__in=[rollup.pk for rollup in existing.values()]).delete()
+            self.bulk_create([
+                self.model(
+                    advert_id=advert_id,
+                    date=date,
+                    max_percent=values['max_percent'],
+                    first_event_at=values['first_event_at'],
+                    last_event_at=values['last_event_at'],
+                    **values['counts']
+                ) for (advert_id, date), values in rollups.items()
+            ])
+        return len(rollups)
+
+
+class PublishedAdvertSearchManager(models.Manager):
+    pending = threading.local()
+
+    def schedule_refresh(self, advert_ids):
+        """
+        Refresh rows after commit of current transaction.
+        Adverts changed several times in one transaction are refreshed once.
+
+        :param advert_ids: iterable of advert ids
+        :return:
+        """
+
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self.refresh(advert_ids)
+            return
+        advert_ids_set = getattr(self.pending, 'advert_ids', None)
+        if advert_ids_set is None or not any(
+                func == self.refresh_pending
+                for sids, func in connection.run_on_commit):
+            advert_ids_set = self.pending.advert_ids = set()
+            transaction.on_commit(self.refresh_pending)
+        advert_ids_set.update(advert_ids)
+
+    def refresh_pending(self):
+        advert_ids, self.pending.advert_ids = self.pending.advert_ids, None
+        self.refresh(advert_ids)
+
+    def get_source_queryset(self):
+        from cf_adverts.models import PublishedAdvert
+        # proxy managers do not pass through queryset methods
+        return PublishedAdvert.objects.get_queryset().with_collected_percent()
+
+    def build_rows(self, adverts):
+        return [
+            self.model(
+                advert_id=advert.id,
+                title=advert.title,
+                category_id=advert.category_id,
+                location_id=advert.location_id,
+                owner_id=advert.owner_id,
+                status_id=advert.status_id,
+                small_logo=advert.small_logo.name,
+                short_description=advert.short_description,
+                ended_at=advert.ended_at,
+                total_amount=advert.total_amount,
+                collected_amount=advert.collected_amount,
+                collected_percent=advert.collected_percent,
+                created=advert.created,
+                modified=advert.modified
+            ) for advert in adverts
+        ]
+
+    def build_terms(self, adverts):
+        term_model = self.model._meta.get_field('terms').related_model
+        return [
+            term_model(entry_id=advert.id, term=term, weight=weight)
+            for advert in adverts
+            for term, weight in get_document_terms(advert).items()
+        ]
+
+    def refresh(self, advert_ids):
+        """
+        Refresh rows of adverts.
+        Adverts which are not published anymore are removed.
+
+        :param advert_ids: iterable of advert ids
+        :return:
+        """
+
+        advert_ids = list(advert_ids)
+        if not advert_ids:
+            return
+        adverts = list(self.get_source_queryset().filter(
+            pk__in=advert_ids).only(*self.model.SOURCE_FIELDS))
+        term_model = self.model._meta.get_field('terms').related_model
+        with transaction.atomic():
+            term_model.objects.filter(entry_id__in=advert_ids).delete()
+            self.filter(advert_id__in=advert_ids).delete()
+            self.bulk_create(self.build_rows(adverts))
+            term_model.objects.bulk_create(self.build_terms(adverts))
+
+    def rebuild(self, chunk_size=1000):
+        """
+        Rebuild whole table from published adverts.
+
+        :param chunk_size: int
+        :return: int, number of rows
+        """
+
+        total = 0
+        term_model = self.model._meta.get_field('terms').related_model
+        with transaction.atomic():
+            term_model.objects.all().delete()
+            self.all().delete()
+            adverts = self.get_source_queryset().only(
+                *self.model.SOURCE_FIELDS).order_by('pk')
+            last_pk = 0
+            while True:
+                chunk = list(adverts.filter(pk__gt=last_pk)[:chunk_size])
+                if not chunk:
+                    break
+                self.bulk_create(self.build_rows(chunk))
+                term_model.objects.bulk_create(self.build_terms(chunk))
+                last_pk = chunk[-1].pk
+                total += len(chunk)
+        return total
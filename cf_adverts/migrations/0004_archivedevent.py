@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_adverts', '0003_event_timeline_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('base_type', models.CharField(choices=[('CUSTOM', 'custom event'), ('PROJECT_CREATED', 'advert created'), ('PROJECT_EDITED', 'advert changed'), ('USER_JOINED', 'user joined'), ('PERCENT_CHANGED', 'percent changed'), ('PROJECT_DONE', 'advert done'), ('PAYMENT_RECEIVED', 'payment received'), ('RESOURCE_RECEIVED', 'resource received')], max_length=64, verbose_name='base type')),
+                ('percent', models.IntegerField(verbose_name='percent')),
+                ('description', models.TextField(blank=True, default='', verbose_name='description')),
+                ('created', models.DateTimeField(verbose_name='created')),
+                ('modified', models.DateTimeField(verbose_name='modified')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+                ('advert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_events', to='cf_adverts.Advert', verbose_name='advert')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'verbose_name': 'archived advert event',
+                'verbose_name_plural': 'archived advert events',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_adverts', '0004_archivedevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('custom_count', models.IntegerField(default=0, verbose_name='custom events')),
+                ('project_created_count', models.IntegerField(default=0, verbose_name='advert created events')),
+                ('project_edited_count', models.IntegerField(default=0, verbose_name='advert changed events')),
+                ('user_joined_count', models.IntegerField(default=0, verbose_name='user joined events')),
+                ('percent_changed_count', models.IntegerField(default=0, verbose_name='percent changed events')),
+                ('project_done_count', models.IntegerField(default=0, verbose_name='advert done events')),
+                ('payment_received_count', models.IntegerField(default=0, verbose_name='payment received events')),
+                ('resource_received_count', models.IntegerField(default=0, verbose_name='resource received events')),
+                ('max_percent', models.IntegerField(default=0, verbose_name='max percent')),
+                ('first_event_at', models.DateTimeField(verbose_name='first event at')),
+                ('last_event_at', models.DateTimeField(verbose_name='last event at')),
+                ('advert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_rollups', to='cf_adverts.Advert', verbose_name='advert')),
+            ],
+            options={
+                'ordering': ['date'],
+                'verbose_name': 'advert events daily rollup',
+                'verbose_name_plural': 'advert events daily rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventdailyrollup',
+            unique_together=set([('advert', 'date')]),
+        ),
+    ]
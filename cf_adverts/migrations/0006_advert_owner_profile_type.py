@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_owner_profile_type(apps, schema_editor):
+    Advert = apps.get_model('cf_adverts', 'Advert')
+    Profile = apps.get_model('cf_users', 'Profile')
+
+    profiles = Profile.objects.exclude(base_type='').order_by(
+        'base_type', 'user_id').values_list('base_type', 'user_id')
+    batch, batch_type = [], None
+    for base_type, user_id in profiles.iterator():
+        if batch and (base_type != batch_type or len(batch) >= BATCH_SIZE):
+            Advert.objects.filter(owner_id__in=batch).update(
+                owner_profile_type=batch_type)
+            batch = []
+        batch.append(user_id)
+        batch_type = base_type
+    if batch:
+        Advert.objects.filter(owner_id__in=batch).update(
+            owner_profile_type=batch_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_users', '__latest__'),
+        ('cf_adverts', '0005_eventdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advert',
+            name='owner_profile_type',
+            field=models.CharField(blank=True, default='', editable=False, help_text='copy of owner profile type', max_length=64, verbose_name='owner profile type'),
+        ),
+        migrations.RunPython(backfill_owner_profile_type,
+                             migrations.RunPython.noop),
+    ]
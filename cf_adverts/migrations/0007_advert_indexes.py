@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_adverts', '0006_advert_owner_profile_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advert',
+            index=models.Index(fields=['owner_profile_type', 'is_available', 'origin'], name='cf_adverts_advert_owner_type'),
+        ),
+        migrations.AddIndex(
+            model_name='advert',
+            index=models.Index(fields=['is_available', 'origin', 'process_status'], name='cf_adverts_advert_moderation'),
+        ),
+    ]
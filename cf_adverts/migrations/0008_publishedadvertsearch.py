@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import easy_thumbnails.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cf_adverts', '0007_advert_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedAdvertSearch',
+            fields=[
+                ('advert', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='cf_adverts.Advert', verbose_name='advert')),
+                ('title', models.CharField(default='', max_length=2048, verbose_name='title')),
+                ('small_logo', easy_thumbnails.fields.ThumbnailerImageField(upload_to='', verbose_name='small logo')),
+                ('short_description', models.TextField(default='', verbose_name='short description')),
+                ('ended_at', models.DateField(db_index=True, null=True, verbose_name='ended at')),
+                ('total_amount', models.BigIntegerField(default=0, verbose_name='total amount')),
+                ('collected_amount', models.BigIntegerField(default=0, verbose_name='collected amount')),
+                ('collected_percent', models.BigIntegerField(db_index=True, default=0, verbose_name='collected percent')),
+                ('created', models.DateTimeField(verbose_name='created')),
+                ('modified', models.DateTimeField(verbose_name='modified')),
+                ('category', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='cf_adverts.Category', verbose_name='category')),
+                ('location', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='cf_core.Location', verbose_name='location')),
+                ('owner', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='owner')),
+                ('status', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='cf_core.Status', verbose_name='status')),
+            ],
+            options={
+                'verbose_name': 'published advert search entry',
+                'verbose_name_plural': 'published advert search entries',
+            },
+        ),
+    ]
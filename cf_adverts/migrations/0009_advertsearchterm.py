@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cf_adverts', '0008_publishedadvertsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64, verbose_name='term')),
+                ('weight', models.IntegerField(default=1, verbose_name='weight')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='cf_adverts.PublishedAdvertSearch', verbose_name='search entry')),
+            ],
+            options={
+                'verbose_name': 'advert search term',
+                'verbose_name_plural': 'advert search terms',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='advertsearchterm',
+            unique_together=set([('term', 'entry')]),
+        ),
+    ]
@@ -5,5 +5,9 @@ from .advert import BannedAdvert
 from .advert import AdvertEstimate
 from .advert import NewAdvert
 from .category import Category
+from .search import PublishedAdvertSearch
+from .search import AdvertSearchTerm
 from .event import Event
+from .event import ArchivedEvent
+from .event import EventDailyRollup
 from .event_receivers import *
@@ -1,18 +1,24 @@
 import logging
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
 from django.db.models.signals import post_save
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
 from model_utils.models import TimeStampedModel
 from easy_thumbnails.fields import ThumbnailerImageField
 
 from cf_core import managers as core_managers
 from cf_core.models import BaseModerateModel
 from cf_core import utils
+from cf_users.models import Profile
 from cf_adverts import managers
-from cf_adverts.signals import project_created, project_edited, project_status_changed
+from cf_adverts.signals import (
+    project_created, project_edited, project_status_changed, projects_updated
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +79,15 @@ class Advert(BaseModerateModel, TimeStampedModel):
         related_name='owned_projects'
     )
 
+    owner_profile_type = models.CharField(
+        verbose_name=_('owner profile type'),
+        max_length=64,
+        default='',
+        blank=True,
+        editable=False,
+        help_text=_('copy of owner profile type')
+    )
+
     origin = models.OneToOneField(
         'self',
         verbose_name=_('original'),
@@ -156,24 +171,113 @@ class Advert(BaseModerateModel, TimeStampedModel):
 
     def __init__(self, *args, **kwargs):
         super(Advert, self).__init__(*args, **kwargs)
-        self.old_status = getattr(self, 'status', None)
-        self.old_ended_at = getattr(self, 'ended_at', None)
+        self._loaded_values = {}
+        self._snapshot_loaded_values()
+
+    def _snapshot_loaded_values(self, fields=None):
+        """
+        Remember current values of concrete fields.
+        Deferred fields are skipped until they are loaded.
+
+        :param fields: iterable of field names or None for all fields
+        :return:
+        """
+
+        for field in self._meta.concrete_fields:
+            if fields is not None and field.name not in fields and \
+                    field.attname not in fields:
+                continue
+            if field.attname in self.__dict__:
+                value = self.__dict__[field.attname]
+                if isinstance(field, models.FileField):
+                    value = getattr(value, 'name', value)
+                self._loaded_values[field.attname] = value
+
+    def refresh_from_db(self, using=None, fields=None):
+        super(Advert, self).refresh_from_db(using=using, fields=fields)
+        self._snapshot_loaded_values(fields)
+
+    def get_loaded_value(self, field_name, default=None):
+        """
+        Return field value as it was loaded from database.
+
+        :param field_name: str, field attname
+        :param default: value if field was not loaded
+        :return:
+        """
+
+        return self._loaded_values.get(field_name, default)
+
+    def get_dirty_fields(self):
+        """
+        Return fields changed since instance was loaded or saved.
+
+        :return: dict {field name: loaded value}
+        """
+
+        dirty_fields = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            current_value = self.__dict__[field.attname]
+            if isinstance(current_value, File) and not (
+                    isinstance(current_value, FieldFile) and
+                    current_value._committed):
+                # new file is written to storage by save of the column
+                dirty_fields[field.name] = self._loaded_values.get(
+                    field.attname)
+                continue
+            if isinstance(field, models.FileField):
+                current_value = getattr(current_value, 'name', current_value)
+            if field.attname not in self._loaded_values or \
+                    self.normalize_value(field, current_value) != \
+                    self.normalize_value(field,
+                                         self._loaded_values[field.attname]):
+                dirty_fields[field.name] = self._loaded_values.get(
+                    field.attname)
+        return dirty_fields
+
+    @staticmethod
+    def normalize_value(field, value):
+        """
+        Convert value to the type returned by database,
+        e.g. datetime assigned to DateField to date.
+        """
+
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            return value
+
+    @property
+    def old_status(self):
+        status_id = self.get_loaded_value('status_id')
+        if status_id is None:
+            return None
+        if status_id == self.status_id:
+            return self.status
+        status_model = self._meta.get_field('status').related_model
+        return status_model.objects.filter(pk=status_id).first()
+
+    @property
+    def old_ended_at(self):
+        return self.get_loaded_value('ended_at')
 
     def process_moderate(self, moderation_note, commit=True, with_check=True):
         if with_check:
-            draft = DraftAdvert.objects.filter(pk=self.pk).last()
-            new_project = NewAdvert.objects.filter(pk=self.pk).last()
-            banned_project = NewAdvert.objects.filter(pk=self.pk).last()
-
-            if draft:
-                draft.process_moderate(moderation_note, commit=commit,
-                                       with_check=False)
-            elif new_project:
-                new_project.process_moderate(moderation_note, commit=commit,
-                                             with_check=False)
-            elif banned_project:
-                banned_project.process_moderate(moderation_note, commit=commit,
-                                                with_check=False)
+            instance = Advert.objects.with_moderation_state().filter(
+                pk=self.pk).last()
+            proxy_model = instance and {
+                managers.MODERATION_STATE_CHOICES.DRAFT: DraftAdvert,
+                managers.MODERATION_STATE_CHOICES.NEW: NewAdvert,
+                managers.MODERATION_STATE_CHOICES.BANNED: BannedAdvert,
+            }.get(instance.moderation_state)
+
+            if proxy_model:
+                # proxy models share table and fields with advert
+                instance.__class__ = proxy_model
+                instance.process_moderate(moderation_note, commit=commit,
+                                          with_check=False)
             else:
                 super(Advert, self).process_moderate(moderation_note,
                                                      commit=commit)
@@ -183,8 +287,8 @@ class Advert(BaseModerateModel, TimeStampedModel):
 
     def perms(self, user):
         return {
-            'can_manage_content': self.can_manage_roles(user),
-            'can_manage_roles': self.can_manage_content(user)
+            'can_manage_content': self.can_manage_content(user),
+            'can_manage_roles': self.can_manage_roles(user)
         }
 
     def get_expired_at(self):
@@ -195,29 +299,85 @@ class Advert(BaseModerateModel, TimeStampedModel):
 
     @property
     def is_draft(self):
-        return self.origin is not None
+        return self.origin_id is not None
 
     @classmethod
     def autocomplete_search_fields(cls):
         """ autocomplete search fields for django-jet """
         return 'title',
 
-    def get_collected_percent(self):
-        if self.collected_amount:
-            return int(
-                self.collected_amount * 100.0 / float(self.total_amount)
-            )
+    @staticmethod
+    def calculate_percent(collected_amount, total_amount):
+        if collected_amount and total_amount:
+            return collected_amount * 100 // total_amount
         return 0
 
+    def get_collected_percent(self):
+        return self.calculate_percent(self.collected_amount,
+                                      self.total_amount)
+
+    def add_collected_amount(self, amount):
+        """
+        Atomically increment collected amount of the advert.
+
+        :param amount: int
+        :return: tuple (old percent, new percent)
+        """
+
+        percents = Advert.objects.apply_payments([(self.id, amount)])
+        self.refresh_from_db(fields=['collected_amount', 'modified'])
+        return percents.get(self.id)
+
     def has_draft(self):
+        if hasattr(self, 'draft_exists'):
+            return self.draft_exists
+        if self.is_draft:
+            # drafts are not available, so they never get own draft
+            return False
         return Advert.objects.filter(origin_id=self.id).exists()
 
+    def is_published(self, loaded=False):
+        """
+        Return whether advert is shown by `PublishedAdvert` manager.
+
+        :param loaded: check values loaded from database
+        :return: bool
+        """
+
+        values = dict(
+            (name, self.get_loaded_value(name) if loaded
+             else getattr(self, name))
+            for name in ('origin_id', 'is_available', 'owner_profile_type')
+        )
+        return values['origin_id'] is None and \
+            values['is_available'] == \
+            BaseModerateModel.MODERATE_STATUS_CHOICES.ALLOWED and \
+            values['owner_profile_type'] == Profile.TYPE_CHOICES.NCO
+
     def get_draft(self):
         try:
             return self.draft
         except Advert.DoesNotExist:
             pass
 
+    @classmethod
+    def get_draft_copy_fields(cls):
+        """
+        Return attribute names copied between draft and original.
+        Computed once per class from `DraftAdvert.exclude_fields`.
+
+        :return: tuple of field attnames
+        """
+
+        copy_fields = cls.__dict__.get('_draft_copy_fields')
+        if copy_fields is None:
+            copy_fields = tuple(
+                field.attname for field in cls._meta.concrete_fields
+                if field.name not in DraftAdvert.exclude_fields
+            )
+            cls._draft_copy_fields = copy_fields
+        return copy_fields
+
     @transaction.atomic
     def get_or_create_draft(self):
         draft = self.get_draft()
@@ -227,30 +387,24 @@ class Advert(BaseModerateModel, TimeStampedModel):
 
         draft = DraftAdvert(
             origin_id=self.id,
-            status=self.status
+            status_id=self.status_id
         )
 
-        for field in self._meta.fields:
-            if field.name not in DraftAdvert.exclude_fields:
-                if isinstance(field, models.ForeignObject):
-                    field_name = '{field_name}_id'.format(
-                        field_name=field.name)
-                    setattr(draft, field_name, getattr(self, field_name))
-                else:
-                    setattr(draft, field.name, getattr(self, field.name))
+        for attname in self.get_draft_copy_fields():
+            setattr(draft, attname, getattr(self, attname))
         draft.save()
 
-        for estimate in self.estimates.all():
-            draft.estimates.create(
-                title=estimate.title,
-                amount=estimate.amount,
-            )
+        AdvertEstimate.objects.bulk_create([
+            AdvertEstimate(advert_id=draft.id, title=title, amount=amount)
+            for title, amount in self.estimates.values_list('title', 'amount')
+        ])
         return draft
 
     @transaction.atomic
     def apply_draft_to_origin(self):
         """
         Apply draft instance to origin.
+        Only changed columns and estimate rows are written.
 
         :return:
         """
@@ -259,34 +413,134 @@ class Advert(BaseModerateModel, TimeStampedModel):
         logger.info("Draft project #{pk} start applying...".format(
             pk=self.pk,
         ))
-        for field in self._meta.fields:
-            if field.name not in DraftAdvert.exclude_fields:
-                if isinstance(field, models.ForeignObject):
-                    field_name = '{field_name}_id'.format(
-                        field_name=field.name)
-                    setattr(original, field_name, getattr(self, field_name))
-                else:
-                    setattr(original, field.name, getattr(self, field.name))
-
-        logger.info("Draft project #{pk} successfully applied...".format(
-            pk=self.pk,
-        ))
-        original.save()
-
-        original.estimates.all().delete()
-        self.estimates.update(advert_id=original.id)
-        original.send_edit_signal(instance=original)
+        for attname in self.get_draft_copy_fields():
+            setattr(original, attname, getattr(self, attname))
+
+        changed_fields = list(original.get_dirty_fields())
+        if changed_fields:
+            original.save(update_fields=changed_fields + ['modified'])
+        estimates_changed = self.apply_estimates_to(original)
+
+        logger.info("Draft project #{pk} successfully applied. "
+                    "Changed fields: {fields}. "
+                    "Estimates changed: {estimates_changed}".format(
+                        pk=self.pk,
+                        fields=changed_fields,
+                        estimates_changed=estimates_changed
+                    ))
+        if changed_fields or estimates_changed:
+            original.send_edit_signal(instance=original)
         return original
 
-    def get_base_permissions(self, user):
+    def apply_estimates_to(self, advert):
+        """
+        Synchronize estimates of `advert` with own estimates.
+        Rows are compared by position, so unchanged rows are kept,
+        changed rows are updated, missing rows are created
+        and redundant rows are deleted.
+
+        :param advert: Advert instance
+        :return: bool, True if any estimate row was written
+        """
+
+        source_rows = list(
+            self.estimates.order_by('id').values_list('title', 'amount')
+        )
+        target_rows = list(
+            advert.estimates.order_by('id').values_list('id', 'title',
+                                                        'amount')
+        )
+        now = timezone.now()
+        changed = False
+
+        rows = zip(source_rows, target_rows)
+        for (title, amount), (pk, old_title, old_amount) in rows:
+            if (title, amount) != (old_title, old_amount):
+                AdvertEstimate.objects.filter(pk=pk).update(
+                    title=title,
+                    amount=amount,
+                    modified=now
+                )
+                changed = True
+
+        if len(source_rows) > len(target_rows):
+            AdvertEstimate.objects.bulk_create([
+                AdvertEstimate(advert_id=advert.id, title=title,
+                               amount=amount)
+                for title, amount in source_rows[len(target_rows):]
+            ])
+            changed = True
+        elif len(source_rows) < len(target_rows):
+            AdvertEstimate.objects.filter(pk__in=[
+                pk for pk, title, amount in target_rows[len(source_rows):]
+            ]).delete()
+            changed = True
+        return changed
+
+    @classmethod
+    def get_staff_roles(cls, user):
         # FIXME: moved to another app
-        return self.roles.filter(
+        role_model = cls._meta.get_field('roles').related_model
+        return role_model.objects.filter(
             is_active=True,
             user_id=user.id,
-            base_type=self.roles.model.TYPE_CHOICES.STAFF,
+            base_type=role_model.TYPE_CHOICES.STAFF,
             is_available=BaseModerateModel.MODERATE_STATUS_CHOICES.ALLOWED
         )
 
+    def get_base_permissions(self, user):
+        roles_field = self._meta.get_field('roles').field
+        return self.get_staff_roles(user).filter(
+            **{roles_field.attname: self.id}
+        )
+
+    @classmethod
+    def prefetch_permissions(cls, adverts, user):
+        """
+        Load role flags of `user` for all `adverts` with one query.
+        Flags are cached on instances and used by `can_manage_roles`,
+        `can_manage_content` and `perms`.
+
+        :param adverts: iterable of Advert instances
+        :param user: User instance
+        :return:
+        """
+
+        adverts = [advert for advert in adverts
+                   if user.id not in advert.__dict__.get('_permissions', {})]
+        if not adverts:
+            return
+
+        flags = {
+            advert.id: {'can_manage_roles': False, 'can_manage_content': False}
+            for advert in adverts
+        }
+        if user.id is not None:
+            roles_field = cls._meta.get_field('roles').field
+            roles = cls.get_staff_roles(user).filter(**{
+                '{}__in'.format(roles_field.attname): list(flags)
+            }).values_list(roles_field.attname, 'can_manage_roles',
+                           'can_manage_content')
+            for advert_id, can_manage_roles, can_manage_content in roles:
+                advert_flags = flags[advert_id]
+                advert_flags['can_manage_roles'] |= bool(can_manage_roles)
+                advert_flags['can_manage_content'] |= bool(can_manage_content)
+
+        for advert in adverts:
+            advert.__dict__.setdefault('_permissions', {})[user.id] = \
+                flags[advert.id]
+
+    def get_role_permissions(self, user):
+        """
+        Return cached role flags of `user` for this advert.
+
+        :param user: User instance
+        :return: dict
+        """
+
+        self.prefetch_permissions([self], user)
+        return self._permissions[user.id]
+
     @staticmethod
     def has_staff_permissions(user):
         return user.is_staff or user.is_superuser
@@ -294,14 +548,12 @@ class Advert(BaseModerateModel, TimeStampedModel):
     def can_manage_roles(self, user):
         if self.has_staff_permissions(user) or self.owner_id == user.id:
             return True
-        permissions = self.get_base_permissions(user)
-        return permissions.filter(can_manage_roles=True).exists()
+        return self.get_role_permissions(user)['can_manage_roles']
 
     def can_manage_content(self, user):
         if self.has_staff_permissions(user):
             return True
-        permissions = self.get_base_permissions(user)
-        return permissions.filter(can_manage_content=True).exists()
+        return self.get_role_permissions(user)['can_manage_content']
 
     def get_active_roles(self):
         # FIXME: moved to another app
@@ -341,28 +593,72 @@ class Advert(BaseModerateModel, TimeStampedModel):
 
     @staticmethod
     def send_status_change_signal(**kwargs):
-        if not kwargs['created'] and kwargs['instance'].old_status != \
-                kwargs['instance'].status:
-            project_status_changed.send(sender=kwargs['instance'],
-                                        old_status=kwargs[
-                                            'instance'].old_status,
-                                        new_status=kwargs['instance'].status)
-        kwargs['instance']._status = kwargs['instance'].status
+        instance = kwargs['instance']
+        if not kwargs['created'] and \
+                instance.get_loaded_value('status_id') != instance.status_id:
+            project_status_changed.send(sender=instance,
+                                        old_status=instance.old_status,
+                                        new_status=instance.status)
 
     @staticmethod
     def send_edit_signal(**kwargs):
         project_edited.send(sender=kwargs['instance'])
 
+    @staticmethod
+    def sync_owner_profile_type(**kwargs):
+        profile = kwargs['instance']
+        adverts = Advert.objects.filter(owner_id=profile.user_id).exclude(
+            owner_profile_type=profile.base_type
+        )
+        advert_ids = list(adverts.values_list('id', flat=True))
+        if advert_ids:
+            Advert.objects.filter(pk__in=advert_ids).update(
+                owner_profile_type=profile.base_type)
+            projects_updated.send(sender=Advert, advert_ids=advert_ids)
+
     def save(self, *args, **kwargs):
-        origin = Advert.objects.filter(id=self.id).last()
-        if origin and self.is_available and not origin.is_available and \
+        """
+        Save instance.
+        Existing rows are updated only with changed columns
+        unless `update_fields` is passed explicitly,
+        nothing is written when no column is changed.
+        """
+
+        if self._state.adding or \
+                self.get_loaded_value('owner_id') != self.owner_id:
+            self.owner_profile_type = Profile.objects.filter(
+                user_id=self.owner_id).values_list(
+                'base_type', flat=True).first() or ''
+
+        if not self._state.adding and self.is_available and \
+                not self.get_loaded_value('is_available', True) and \
                 not self.ended_at:
-            self.ended_at = timezone.now() + timezone.timedelta(days=60)
+            self.ended_at = get_now_date() + timezone.timedelta(days=60)
+
+        if not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert') and not args:
+            dirty_fields = list(self.get_dirty_fields())
+            kwargs['update_fields'] = dirty_fields + [
+                'modified'] if dirty_fields else []
+
         super(Advert, self).save(*args, **kwargs)
+        self._snapshot_loaded_values(kwargs.get('update_fields'))
 
     class Meta:
         verbose_name = _('advert')
         verbose_name_plural = _('adverts')
+        indexes = [
+            # published, new and draft proxy managers
+            models.Index(
+                fields=['owner_profile_type', 'is_available', 'origin'],
+                name='cf_adverts_advert_owner_type'
+            ),
+            # moderation state filters and banned proxy manager
+            models.Index(
+                fields=['is_available', 'origin', 'process_status'],
+                name='cf_adverts_advert_moderation'
+            ),
+        ]
 
 
 class AdvertEstimate(TimeStampedModel):
@@ -467,6 +763,7 @@ class DraftAdvert(Advert):
 
 
 post_save.connect(Advert.send_create_signal, sender=Advert)
+post_save.connect(Advert.sync_owner_profile_type, sender=Profile)
 post_save.connect(PublishedAdvert.send_status_change_signal,
                   sender=PublishedAdvert)
 post_save.connect(Advert.send_status_change_signal, sender=Advert)
@@ -4,8 +4,12 @@ from django.utils.translation import ugettext_lazy as _
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
 
+from cf_adverts import managers
+
 __all__ = [
-    'Event'
+    'Event',
+    'ArchivedEvent',
+    'EventDailyRollup'
 ]
 
 
@@ -46,5 +50,92 @@ class Event(TimeStampedModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['advert', '-created', 'id'],
+                         name='cf_adverts_event_timeline_idx'),
+        ]
         verbose_name = _('advert event')
         verbose_name_plural = _('advert events')
+
+
+class ArchivedEvent(models.Model):
+    """
+    Event moved from hot events table by retention job.
+    Keeps primary key of the original event.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    advert = models.ForeignKey(
+        'cf_adverts.advert',
+        verbose_name=_('advert'),
+        related_name='archived_events'
+    )
+    base_type = models.CharField(verbose_name=_('base type'), max_length=64,
+                                 choices=Event.TYPE_CHOICES)
+    percent = models.IntegerField(verbose_name=_('percent'))
+    description = models.TextField(verbose_name=_('description'), default='',
+                                   blank=True)
+    created = models.DateTimeField(verbose_name=_('created'))
+    modified = models.DateTimeField(verbose_name=_('modified'))
+    archived_at = models.DateTimeField(verbose_name=_('archived at'),
+                                       auto_now_add=True)
+
+    def __str__(self):
+        return self.description
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = _('archived advert event')
+        verbose_name_plural = _('archived advert events')
+
+
+class EventDailyRollup(models.Model):
+    """
+    Daily statistics of advert events.
+    Would be used to build charts without scanning events table.
+    """
+
+    advert = models.ForeignKey(
+        'cf_adverts.advert',
+        verbose_name=_('advert'),
+        related_name='event_rollups'
+    )
+    date = models.DateField(verbose_name=_('date'))
+
+    custom_count = models.IntegerField(
+        verbose_name=_('custom events'), default=0)
+    project_created_count = models.IntegerField(
+        verbose_name=_('advert created events'), default=0)
+    project_edited_count = models.IntegerField(
+        verbose_name=_('advert changed events'), default=0)
+    user_joined_count = models.IntegerField(
+        verbose_name=_('user joined events'), default=0)
+    percent_changed_count = models.IntegerField(
+        verbose_name=_('percent changed events'), default=0)
+    project_done_count = models.IntegerField(
+        verbose_name=_('advert done events'), default=0)
+    payment_received_count = models.IntegerField(
+        verbose_name=_('payment received events'), default=0)
+    resource_received_count = models.IntegerField(
+        verbose_name=_('resource received events'), default=0)
+
+    max_percent = models.IntegerField(verbose_name=_('max percent'),
+                                      default=0)
+    first_event_at = models.DateTimeField(verbose_name=_('first event at'))
+    last_event_at = models.DateTimeField(verbose_name=_('last event at'))
+
+    objects = managers.EventDailyRollupManager()
+
+    @staticmethod
+    def get_count_field(base_type):
+        return '{}_count'.format(base_type.lower())
+
+    def __str__(self):
+        return '{advert_id}: {date}'.format(advert_id=self.advert_id,
+                                            date=self.date)
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ('advert', 'date')
+        verbose_name = _('advert events daily rollup')
+        verbose_name_plural = _('advert events daily rollups')
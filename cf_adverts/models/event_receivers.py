@@ -1,6 +1,7 @@
 import logging
 from django.utils.translation import ugettext_lazy as _
 
+from cf_adverts.events import event_buffer
 from cf_adverts.models.event import Event
 from cf_adverts.signals import (
     project_created, project_edited, project_approved
@@ -10,25 +11,12 @@ logger = logging.getLogger(__name__)
 
 
 def handle_logger_event(advert, base_type, description, percent):
-    event = Event.objects.create(
+    event_buffer.add(
         advert=advert,
         base_type=base_type,
         description=description,
         percent=percent
     )
-    logger.info(
-        "New event #{pk}. "
-        "Type: '{base_type}'. "
-        "Advert: {advert}. "
-        "Description: {description}. "
-        "Percent: {percent}".format(
-            pk=event.id,
-            advert=advert,
-            base_type=base_type,
-            description=description,
-            percent=percent
-        )
-    )
 
 
 def payment_signal_receiver(**kwargs):
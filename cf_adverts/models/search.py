@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.db import models
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from easy_thumbnails.fields import ThumbnailerImageField
+
+from cf_adverts import managers
+from cf_adverts.search_cache import search_cache
+from cf_adverts.models.advert import (
+    Advert, BannedAdvert, DraftAdvert, NewAdvert, PublishedAdvert
+)
+from cf_adverts.signals import (
+    project_edited, project_status_changed, projects_updated
+)
+
+__all__ = [
+    'PublishedAdvertSearch',
+    'AdvertSearchTerm'
+]
+
+
+class PublishedAdvertSearch(models.Model):
+    """
+    Denormalized copy of published adverts.
+    Would be used by search api instead of adverts table.
+    """
+
+    SOURCE_FIELDS = (
+        'id',
+        'title',
+        'category',
+        'location',
+        'owner',
+        'status',
+        'small_logo',
+        'short_description',
+        'ended_at',
+        'total_amount',
+        'collected_amount',
+        'created',
+        'modified',
+        'description',
+    )
+
+    advert = models.OneToOneField(
+        'cf_adverts.Advert',
+        verbose_name=_('advert'),
+        related_name='search_entry',
+        primary_key=True
+    )
+    title = models.CharField(verbose_name=_('title'), max_length=2048,
+                             default='')
+    category = models.ForeignKey(
+        'cf_adverts.Category',
+        verbose_name=_('category'),
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    location = models.ForeignKey(
+        'cf_core.Location',
+        verbose_name=_('location'),
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_('owner'),
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    status = models.ForeignKey(
+        'cf_core.Status',
+        verbose_name=_('status'),
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    small_logo = ThumbnailerImageField(verbose_name=_('small logo'))
+    short_description = models.TextField(
+        verbose_name=_('short description'),
+        default=''
+    )
+    ended_at = models.DateField(verbose_name=_('ended at'), null=True,
+                                db_index=True)
+    total_amount = models.BigIntegerField(verbose_name=_('total amount'),
+                                          default=0)
+    collected_amount = models.BigIntegerField(
+        verbose_name=_('collected amount'),
+        default=0
+    )
+    collected_percent = models.BigIntegerField(
+        verbose_name=_('collected percent'),
+        default=0,
+        db_index=True
+    )
+    created = models.DateTimeField(verbose_name=_('created'))
+    modified = models.DateTimeField(verbose_name=_('modified'))
+
+    objects = managers.PublishedAdvertSearchManager()
+
+    def get_expired_at(self):
+        days = 0
+        if self.ended_at:
+            days = (self.ended_at - timezone.now().date()).days
+        return days
+
+    def __str__(self):
+        return self.title
+
+    @staticmethod
+    def refresh_advert(**kwargs):
+        instance = kwargs.get('instance') or kwargs.get('sender')
+        if instance.origin_id is None:
+            PublishedAdvertSearch.objects.schedule_refresh([instance.pk])
+
+    @staticmethod
+    def invalidate_cache(**kwargs):
+        """
+        Cached responses are stale only after changes of published
+        adverts or changes of published state.
+        """
+
+        instance = kwargs.get('instance') or kwargs.get('sender')
+        if instance.is_published() or instance.is_published(loaded=True):
+            search_cache.invalidate()
+
+    @staticmethod
+    def refresh_adverts(**kwargs):
+        PublishedAdvertSearch.objects.schedule_refresh(kwargs['advert_ids'])
+
+    class Meta:
+        verbose_name = _('published advert search entry')
+        verbose_name_plural = _('published advert search entries')
+
+
+class AdvertSearchTerm(models.Model):
+    """
+    Inverted index of published adverts texts.
+    Term is stem of word from title or descriptions.
+    """
+
+    entry = models.ForeignKey(
+        'cf_adverts.PublishedAdvertSearch',
+        verbose_name=_('search entry'),
+        related_name='terms'
+    )
+    term = models.CharField(verbose_name=_('term'), max_length=64,
+                            db_index=True)
+    weight = models.IntegerField(verbose_name=_('weight'), default=1)
+
+    def __str__(self):
+        return self.term
+
+    class Meta:
+        unique_together = ('term', 'entry')
+        verbose_name = _('advert search term')
+        verbose_name_plural = _('advert search terms')
+
+
+# deleted adverts are removed by cascade of `advert` field
+for advert_model in (Advert, PublishedAdvert, NewAdvert, BannedAdvert,
+                     DraftAdvert):
+    post_save.connect(PublishedAdvertSearch.refresh_advert,
+                      sender=advert_model)
+    post_save.connect(PublishedAdvertSearch.invalidate_cache,
+                      sender=advert_model)
+
+project_edited.connect(receiver=PublishedAdvertSearch.refresh_advert)
+project_status_changed.connect(receiver=PublishedAdvertSearch.refresh_advert)
+projects_updated.connect(receiver=PublishedAdvertSearch.refresh_adverts)
+
+project_edited.connect(receiver=PublishedAdvertSearch.invalidate_cache)
+project_status_changed.connect(
+    receiver=PublishedAdvertSearch.invalidate_cache)
+projects_updated.connect(receiver=search_cache.invalidate, weak=False)
@@ -0,0 +1,162 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cf_adverts.models import Advert, ArchivedEvent, Event
+from cf_adverts.models.advert import get_now_date
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'EventRetentionPolicy',
+    'compact_events',
+    'archive_events',
+    'process_events_retention'
+]
+
+
+class EventRetentionPolicy(object):
+    """
+    Settings of events retention job.
+    Default values could be overridden by `ADVERTS_EVENT_RETENTION` setting.
+
+    :param compact_types: event types merged when repeated
+    :param compact_window: max seconds between merged events
+    :param compact_scan_days: age of events scanned by compaction,
+        older events were compacted by previous runs
+    :param archive_after_days: age of archived events of finished adverts
+    :param chunk_size: rows processed in one transaction
+    """
+
+    def __init__(self, compact_types=(Event.TYPE_CHOICES.PERCENT_CHANGED,
+                                      Event.TYPE_CHOICES.PROJECT_EDITED),
+                 compact_window=300, compact_scan_days=7,
+                 archive_after_days=90, chunk_size=1000):
+        self.compact_types = tuple(compact_types)
+        self.compact_window = timezone.timedelta(seconds=compact_window)
+        self.compact_scan_days = compact_scan_days
+        self.archive_after_days = archive_after_days
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        options = dict(getattr(settings, 'ADVERTS_EVENT_RETENTION', {}))
+        options.update(
+            (key, value) for key, value in overrides.items()
+            if value is not None
+        )
+        return cls(**options)
+
+
+def chunks(items, size):
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def get_redundant_event_ids(policy):
+    """
+    Find runs of same type events of one advert created in
+    `compact_window` of each other. Last event of every run is kept.
+    Only events of last `compact_scan_days` are scanned, so cost
+    does not grow with size of events table.
+
+    :param policy: EventRetentionPolicy instance
+    :return: list of event ids
+    """
+
+    redundant_ids = []
+    previous = None
+    events = Event.objects.filter(
+        created__gte=timezone.now() - timezone.timedelta(
+            days=policy.compact_scan_days)
+    ).order_by('advert_id', 'created', 'id').values_list(
+        'id', 'advert_id', 'base_type', 'created')
+    for event in events.iterator():
+        pk, advert_id, base_type, created = event
+        if previous is not None and base_type in policy.compact_types and \
+                previous[1:3] == (advert_id, base_type) and \
+                created - previous[3] <= policy.compact_window:
+            redundant_ids.append(previous[0])
+        previous = event
+    return redundant_ids
+
+
+def compact_events(policy, dry_run=False):
+    """
+    Delete redundant events.
+
+    :param policy: EventRetentionPolicy instance
+    :param dry_run: bool, only count events
+    :return: int, number of compacted events
+    """
+
+    redundant_ids = get_redundant_event_ids(policy)
+    if not dry_run:
+        for ids in chunks(redundant_ids, policy.chunk_size):
+            Event.objects.filter(pk__in=ids).delete()
+    logger.info("Events compaction. Redundant events: %s. Dry run: %s",
+                len(redundant_ids), dry_run)
+    return len(redundant_ids)
+
+
+def archive_events(policy, dry_run=False):
+    """
+    Move old events of finished adverts to archive table.
+
+    :param policy: EventRetentionPolicy instance
+    :param dry_run: bool, only count events
+    :return: int, number of archived events
+    """
+
+    expired_at = timezone.now() - timezone.timedelta(
+        days=policy.archive_after_days)
+    queryset = Event.objects.filter(
+        created__lt=expired_at,
+        advert__in=Advert.objects.filter(
+            ended_at__lt=get_now_date()).values('pk')
+    )
+    if dry_run:
+        total = queryset.count()
+    else:
+        total = 0
+        while True:
+            with transaction.atomic():
+                events = list(queryset.order_by('id')[:policy.chunk_size])
+                if not events:
+                    break
+                ArchivedEvent.objects.bulk_create([
+                    ArchivedEvent(
+                        id=event.id,
+                        advert_id=event.advert_id,
+                        base_type=event.base_type,
+                        percent=event.percent,
+                        description=event.description,
+                        created=event.created,
+                        modified=event.modified
+                    ) for event in events
+                ])
+                Event.objects.filter(
+                    pk__in=[event.id for event in events]).delete()
+            total += len(events)
+    logger.info("Events archiving. Archived events: %s. Dry run: %s",
+                total, dry_run)
+    return total
+
+
+def process_events_retention(policy=None, dry_run=False):
+    """
+    Compact and archive events.
+
+    :param policy: EventRetentionPolicy instance
+    :param dry_run: bool, only build report
+    :return: dict report
+    """
+
+    policy = policy or EventRetentionPolicy.from_settings()
+    return {
+        'compacted': compact_events(policy, dry_run=dry_run),
+        'archived': archive_events(policy, dry_run=dry_run),
+        'dry_run': dry_run
+    }
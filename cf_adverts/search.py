@@ -0,0 +1,163 @@
+"""
+Full-text search of published adverts.
+
+Texts are split into words and reduced to stems by light suffix stripping
+for russian and english languages. Stems with weights are stored in
+`AdvertSearchTerm` table, so search uses index prefix lookups instead of
+`LIKE '%...%'` scans.
+"""
+import re
+from collections import Counter
+
+from django.db import models
+
+__all__ = [
+    'FIELD_WEIGHTS',
+    'tokenize',
+    'stem',
+    'get_terms',
+    'get_document_terms',
+    'search_adverts'
+]
+
+FIELD_WEIGHTS = (
+    ('title', 5),
+    ('short_description', 2),
+    ('description', 1),
+)
+
+MIN_STEM_LENGTH = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with',
+    'а', 'без', 'в', 'во', 'для', 'до', 'же', 'за', 'и', 'из', 'или', 'к',
+    'как', 'на', 'не', 'но', 'о', 'об', 'от', 'по', 'при', 'с', 'со', 'у',
+    'что', 'это',
+])
+
+RUSSIAN_REFLEXIVE_ENDINGS = ('ся', 'сь')
+RUSSIAN_ENDINGS = sorted([
+    'ившись', 'ывшись', 'вшись', 'ивши', 'ывши', 'вши', 'ив', 'ыв',
+    'ейшая', 'ейшее', 'ейший', 'ейшие', 'ейшей',
+    'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их',
+    'ая', 'яя', 'ое', 'ее', 'ой', 'ей', 'ий', 'ый', 'ые', 'ие', 'ую', 'юю',
+    'ым', 'им', 'ою', 'ею',
+    'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию', 'ью', 'ия', 'ья',
+    'ть', 'ешь', 'ете', 'ите', 'ишь', 'ит', 'ет', 'ут', 'ют', 'ат', 'ят',
+    'ла', 'ли', 'ло', 'ны', 'ен', 'ость', 'ости',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+ENGLISH_SUFFIXES = (
+    ('ational', 'ate'), ('tional', 'tion'), ('ization', 'ize'),
+    ('fulness', 'ful'), ('iveness', 'ive'), ('ousness', 'ous'),
+    ('ations', 'ate'), ('ation', 'ate'), ('ingly', ''), ('edly', ''),
+    ('ments', ''), ('ment', ''), ('ness', ''), ('ings', ''), ('ing', ''),
+    ('ies', 'y'), ('ied', 'y'), ('ers', ''), ('er', ''), ('ed', ''),
+    ('es', ''), ('ly', ''), ('s', ''),
+)
+
+
+def tokenize(text):
+    """
+    Split text to lowercase words without stop words.
+
+    :param text: str
+    :return: list of str
+    """
+
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return [word for word in words
+            if word not in STOP_WORDS and not word.isdigit()]
+
+
+def stem_russian(word):
+    for ending in RUSSIAN_REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and \
+                len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and \
+                len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def stem_english(word):
+    if word.endswith('ss'):
+        return word
+    for suffix, replacement in ENGLISH_SUFFIXES:
+        if word.endswith(suffix) and \
+                len(word) - len(suffix) + len(replacement) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def stem(word):
+    if CYRILLIC_RE.search(word):
+        return stem_russian(word)
+    return stem_english(word)
+
+
+def get_terms(text):
+    """
+    Return stems of text words.
+
+    :param text: str
+    :return: list of str
+    """
+
+    return [stem(word)[:MAX_TERM_LENGTH] for word in tokenize(text)]
+
+
+def get_document_terms(advert):
+    """
+    Return weighted terms of advert text fields.
+
+    :param advert: object with `FIELD_WEIGHTS` attributes
+    :return: Counter {term: weight}
+    """
+
+    terms = Counter()
+    for field_name, weight in FIELD_WEIGHTS:
+        for term in get_terms(getattr(advert, field_name, '')):
+            terms[term] += weight
+    return terms
+
+
+def search_adverts(queryset, query):
+    """
+    Filter `PublishedAdvertSearch` queryset with text query.
+    Every query word should match term prefix.
+    Results are ranked by sum of matched term weights.
+
+    :param queryset: PublishedAdvertSearch queryset
+    :param query: str
+    :return: queryset annotated with `search_rank`
+    """
+
+    terms = sorted(set(get_terms(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none()
+
+    condition = models.Q()
+    for term in terms:
+        condition |= models.Q(terms__term__startswith=term)
+    matches = {
+        'search_match_{}'.format(index): models.Max(models.Case(
+            models.When(terms__term__startswith=term, then=models.Value(1)),
+            default=models.Value(0),
+            output_field=models.IntegerField()
+        )) for index, term in enumerate(terms)
+    }
+    return queryset.filter(condition).annotate(
+        search_rank=models.Sum('terms__weight'),
+        **matches
+    ).filter(**{name: 1 for name in matches}).order_by('-search_rank', '-pk')
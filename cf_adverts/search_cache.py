@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'SearchResponseCache',
+    'search_cache'
+]
+
+
+class SearchResponseCache(object):
+    """
+    Cache of search responses.
+
+    Keys contain generation counter, which is bumped after commit of
+    any advert change, so all cached responses become stale at once.
+    Only one process builds missed response, another processes wait
+    for it up to `wait_timeout` seconds.
+    """
+
+    prefix = 'cf_adverts:search'
+    ignored_params = ('page',)
+    cursor_param = 'cursor'
+    uncached_params = ('owned',)
+
+    def __init__(self, alias='default', timeout=300, lock_timeout=10,
+                 wait_timeout=2.0, wait_interval=0.05):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.wait_interval = wait_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def generation_key(self):
+        return '{prefix}:generation'.format(prefix=self.prefix)
+
+    def get_stat_key(self, name):
+        return '{prefix}:stats:{name}'.format(prefix=self.prefix, name=name)
+
+    def get_generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # new counter should not match keys of evicted counter
+            self.cache.add(self.generation_key, int(time.time() * 1000),
+                           timeout=None)
+            generation = self.cache.get(self.generation_key)
+        return generation
+
+    def bump_generation(self):
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.get_generation()
+
+    def invalidate(self, **kwargs):
+        transaction.on_commit(self.bump_generation)
+
+    def increment_stat(self, name):
+        key = self.get_stat_key(name)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 1, timeout=None)
+
+    def get_stats(self):
+        hits = self.cache.get(self.get_stat_key('hits')) or 0
+        misses = self.cache.get(self.get_stat_key('misses')) or 0
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': float(hits) / total if total else 0.0
+        }
+
+    def is_cacheable(self, request):
+        return self.timeout > 0 and not any(
+            request.query_params.get(param)
+            for param in self.uncached_params
+        )
+
+    def get_key(self, request):
+        """
+        Build key from generation, host, path, pagination mode
+        and normalized params. Default page is not included,
+        so `?page=1` and no page share key, but empty `?cursor=`
+        selects cursor pages and gets another key.
+
+        :param request: rest_framework Request instance
+        :return: str
+        """
+
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if any(values) and key not in self.ignored_params
+        )
+        page = request.query_params.get('page') or '1'
+        cursor_mode = self.cursor_param in request.query_params
+        data = json.dumps([request.get_host(), request.path, params, page,
+                           cursor_mode])
+        return '{prefix}:{generation}:{digest}'.format(
+            prefix=self.prefix,
+            generation=self.get_generation(),
+            digest=hashlib.md5(data.encode('utf-8')).hexdigest()
+        )
+
+    def get_or_build(self, request, build):
+        """
+        Return cached response data or build and cache it.
+
+        :param request: rest_framework Request instance
+        :param build: callable returning response data
+        :return: response data
+        """
+
+        if not self.is_cacheable(request):
+            return build()
+
+        key = self.get_key(request)
+        data = self.cache.get(key)
+        if data is not None:
+            self.increment_stat('hits')
+            return data
+        self.increment_stat('misses')
+
+        lock_key = '{key}:lock'.format(key=key)
+        if self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                data = build()
+                self.cache.set(key, data, timeout=self.timeout)
+            finally:
+                self.cache.delete(lock_key)
+            return data
+
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            time.sleep(self.wait_interval)
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+        logger.warning("Search cache lock wait timeout. Key: %s", key)
+        return build()
+
+
+search_cache = SearchResponseCache(
+    alias=getattr(settings, 'ADVERTS_SEARCH_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'ADVERTS_SEARCH_CACHE_TIMEOUT', 300)
+)
@@ -5,3 +5,6 @@ project_created = Signal()
 project_edited = Signal()
 project_status_changed = Signal()
 project_approved = Signal()
+
+# sent with `advert_ids` after bulk updates bypassing `post_save`
+projects_updated = Signal(providing_args=['advert_ids'])
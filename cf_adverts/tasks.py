@@ -1,9 +1,14 @@
+import itertools
 import logging
 
 from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from celery import shared_task
 
-from cf_adverts.models import DraftAdvert
+from cf_adverts.models import (
+    ArchivedEvent, DraftAdvert, Event, EventDailyRollup
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,3 +29,71 @@ def process_apply_draft_project(draft_id):
         )
         draft.apply_draft_to_origin()
         draft.delete()
+
+
+@shared_task()
+def create_events(payloads, batch_size=500):
+    """
+    Insert advert events sent by `EventBuffer`.
+    Payloads keep creation time, so order of events is preserved.
+
+    :param payloads: list of dicts
+    :param batch_size: int
+    :return:
+    """
+
+    events = [
+        Event(
+            advert_id=payload['advert_id'],
+            base_type=payload['base_type'],
+            description=payload['description'],
+            percent=payload['percent'],
+            created=parse_datetime(payload['created'])
+        ) for payload in payloads
+    ]
+    Event.objects.bulk_create(events, batch_size=batch_size)
+    EventDailyRollup.objects.add_events(events)
+    logger.info("Created %s events", len(events))
+
+
+@shared_task()
+def process_events_retention(dry_run=False):
+    """
+    Compact and archive advert events.
+
+    :param dry_run: bool
+    :return: dict
+    """
+
+    from cf_adverts import retention
+
+    return retention.process_events_retention(dry_run=dry_run)
+
+
+@shared_task()
+def rebuild_event_rollups(days=None):
+    """
+    Rebuild daily rollups from events and archived events tables.
+    Counts of event types merged by retention are not lowered.
+
+    :param days: int, rebuild adverts with events in last days or all
+    :return: int, number of rollups
+    """
+
+    from cf_adverts.retention import EventRetentionPolicy
+
+    events = Event.objects.all()
+    archived_events = ArchivedEvent.objects.all()
+    if days:
+        advert_ids = Event.objects.filter(
+            created__gte=timezone.now() - timezone.timedelta(days=days)
+        ).values('advert_id')
+        events = events.filter(advert_id__in=advert_ids)
+        archived_events = archived_events.filter(advert_id__in=advert_ids)
+
+    policy = EventRetentionPolicy.from_settings()
+    return EventDailyRollup.objects.rebuild(
+        itertools.chain(events.iterator(), archived_events.iterator()),
+        keep_count_fields=[EventDailyRollup.get_count_field(base_type)
+                           for base_type in policy.compact_types]
+    )
@@ -5,6 +5,7 @@ import pytest
 from unittest.mock import patch
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 from django.core.files.base import ContentFile
 
 
@@ -22,6 +23,15 @@ from cf_core.models import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Cached search responses should not be shared between tests.
+    """
+
+    caches['default'].clear()
+
+
 @pytest.fixture
 def user(db):
     return User.objects.create_user('test@example.com', 'pass')
@@ -9,7 +9,7 @@ from django.urls import reverse
 from rest_framework import status, exceptions, test
 from rest_framework.test import force_authenticate
 
-from cf_adverts.api import (
+from cf_adverts.api.views import (
     AdvertViewSet,
     EstimateViewSet,
     EventsViewSet
@@ -176,7 +176,7 @@ class TestProjectAPI(BaseTestViewSetMixin):
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert 'small_logo' in response.data
 
-    def test_get_project_as_draft(self, rf, profile, available_advert):
+    def test_get_project_without_draft(self, rf, profile, available_advert):
         req = rf.get(
             reverse('api:adverts-detail', args=[available_advert.id])
         )
@@ -184,9 +184,34 @@ class TestProjectAPI(BaseTestViewSetMixin):
 
         response = self.get_response_as_viewset({'get': 'retrieve'}, req,
                                                 pk=available_advert.id)
-        draft = available_advert.get_or_create_draft()
 
-        assert response.data['id'] != available_advert.id
+        assert response.data['id'] == available_advert.id
+        assert response.data['has_draft'] is False
+        assert not Advert.objects.filter(origin=available_advert).exists()
+
+    def test_get_project_as_draft(self, rf, profile, available_advert):
+        url = reverse('api:adverts-detail', args=[available_advert.id])
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        etag = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                            pk=available_advert.id)['ETag']
+
+        req = rf.patch(url, data=json.dumps({'title': 'draft title'}),
+                       content_type=JSON_TYPE, HTTP_IF_MATCH=etag)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'patch': 'partial_update'},
+                                                req, pk=available_advert.id)
+        draft = available_advert.get_draft()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == draft.id
+        assert draft.title == 'draft title'
+
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                                pk=available_advert.id)
+
         assert response.data['id'] == draft.id
 
     def test_send_project_to_approve(self, rf, profile, available_advert):
@@ -207,6 +232,152 @@ class TestProjectAPI(BaseTestViewSetMixin):
 
         assert draft.process_status == Advert.MODERATE_PROCESS_TYPES.CHECK
 
+    def test_batch_projects(self, rf, profile, advert, category, location,
+                            start_status):
+        from cf_adverts.models import Event
+
+        item = {
+            'title': 'batch title',
+            'short_description': 'batch description',
+            'category': category.id,
+            'location': location.id,
+            'total_amount': 500
+        }
+        items = [
+            item,
+            dict(item, title='another batch title'),
+            dict(item, total_amount=None),
+            {'id': advert.id, 'title': 'updated title'},
+            {'id': advert.id + 1000, 'title': 'unknown advert'},
+            {'id': advert.id, 'title': 'duplicated title'},
+        ]
+        req = rf.post(reverse('api:adverts-batch'), data=json.dumps(items),
+                      content_type=JSON_TYPE)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'post': 'batch'}, req)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result['status'] for result in response.data] == [
+            status.HTTP_201_CREATED, status.HTTP_201_CREATED,
+            status.HTTP_400_BAD_REQUEST, status.HTTP_200_OK,
+            status.HTTP_404_NOT_FOUND, status.HTTP_400_BAD_REQUEST
+        ]
+        assert 'total_amount' in response.data[2]['errors']
+        assert 'id' in response.data[5]['errors']
+
+        created_ids = [result['data']['id'] for result in response.data[:2]]
+        created = Advert.objects.filter(pk__in=created_ids)
+
+        assert {obj.title for obj in created} == {'batch title',
+                                                  'another batch title'}
+        assert all(obj.owner_id == profile.user.id and
+                   obj.status_id == start_status.id for obj in created)
+        assert Event.objects.filter(
+            advert_id__in=created_ids,
+            base_type=Event.TYPE_CHOICES.PROJECT_CREATED
+        ).count() == 2
+
+        advert.refresh_from_db()
+        assert advert.title == 'updated title'
+
+    def test_batch_projects_published_duplicates(self, rf, profile,
+                                                 available_advert):
+        items = [{'id': available_advert.id, 'title': 'first draft title'},
+                 {'id': available_advert.id, 'title': 'second draft title'}]
+        req = rf.post(reverse('api:adverts-batch'), data=json.dumps(items),
+                      content_type=JSON_TYPE)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'post': 'batch'}, req)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result['status'] for result in response.data] == [
+            status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST]
+        drafts = Advert.objects.filter(origin=available_advert)
+        assert [draft.title for draft in drafts] == ['first draft title']
+
+    def test_batch_projects_limit(self, rf, profile):
+        req = rf.post(reverse('api:adverts-batch'),
+                      data=json.dumps([{}] * (AdvertViewSet.batch_max_size + 1)),
+                      content_type=JSON_TYPE)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'post': 'batch'}, req)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_project_not_modified(self, rf, profile, advert):
+        url = reverse('api:adverts-detail', args=[advert.id])
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                                pk=advert.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag']
+        assert response['Last-Modified']
+
+        req = rf.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        force_authenticate(req, user=profile.user)
+        with mock.patch.object(AdvertViewSet, 'get_serializer') as serializer:
+            not_modified = self.get_response_as_viewset({'get': 'retrieve'},
+                                                        req, pk=advert.id)
+
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not serializer.called
+
+    def test_get_project_modified_by_permissions(self, rf, profile, advert):
+        roles_field = Advert._meta.get_field('roles').field
+        role_model = roles_field.model
+        url = reverse('api:adverts-detail', args=[advert.id])
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                                pk=advert.id)
+
+        assert response.data['perms']['can_manage_content'] is False
+
+        role_model.objects.create(**{
+            roles_field.name: advert,
+            'user': profile.user,
+            'base_type': role_model.TYPE_CHOICES.STAFF,
+            'is_active': True,
+            'is_available': Advert.MODERATE_STATUS_CHOICES.ALLOWED,
+            'can_manage_roles': False,
+            'can_manage_content': True,
+        })
+        req = rf.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                                pk=advert.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['perms']['can_manage_content'] is True
+
+    def test_update_project_precondition(self, rf, profile, advert):
+        url = reverse('api:adverts-detail', args=[advert.id])
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        etag = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                            pk=advert.id)['ETag']
+
+        req = rf.patch(url, data=json.dumps({'title': 'first title'}),
+                       content_type=JSON_TYPE, HTTP_IF_MATCH=etag)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'patch': 'partial_update'},
+                                                req, pk=advert.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+        req = rf.patch(url, data=json.dumps({'title': 'second title'}),
+                       content_type=JSON_TYPE, HTTP_IF_MATCH=etag)
+        force_authenticate(req, user=profile.user)
+        response = self.get_response_as_viewset({'patch': 'partial_update'},
+                                                req, pk=advert.id)
+
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        advert.refresh_from_db()
+        assert advert.title == 'first title'
+
 
 @pytest.mark.django_db
 class TestAdvertEstimate(BaseTestViewSetMixin):
@@ -232,6 +403,29 @@ class TestAdvertEstimate(BaseTestViewSetMixin):
             assert isinstance(response.data, list)
             assert len(response.data) == result_length
 
+    def test_get_advert_estimates_not_modified(self, rf, profile, advert,
+                                               advert_estimates):
+        url = reverse('api:estimates-list') + '?advert={}'.format(advert.id)
+        req = rf.get(url)
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'get': 'list'}, req)
+
+        assert response.status_code == status.HTTP_200_OK
+
+        req = rf.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'get': 'list'}, req)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        advert_estimates[0].delete()
+        req = rf.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'get': 'list'}, req)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == len(advert_estimates) - 1
+
     def test_get_filtered_estimates(self, rf, profile, advert, advert_estimates):
 
         request_data = EstimateListUpdateSerializer(advert_estimates,
@@ -250,3 +444,448 @@ class TestAdvertEstimate(BaseTestViewSetMixin):
             old_value = est.amount
             est.refresh_from_db()
             assert old_value == est.amount
+
+    def test_list_update_estimates(self, rf, profile, advert,
+                                   advert_estimates):
+        from cf_adverts.models import AdvertEstimate
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        kept, changed, renamed = advert_estimates[:3]
+        request_data = [
+            {'id': kept.id, 'title': kept.title, 'amount': kept.amount},
+            {'id': changed.id, 'title': 'changed', 'amount': 1},
+            {'id': renamed.id, 'title': 'renamed', 'amount': renamed.amount},
+            {'title': 'new', 'amount': 2},
+        ]
+        req = rf.post(
+            reverse('api:estimates-list-update') +
+            '?advert={}&delete_missing=1'.format(advert.id),
+            data=json.dumps(request_data),
+            content_type=JSON_TYPE
+        )
+        force_authenticate(req, profile.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_response_as_viewset({'post': 'list_update'},
+                                                    req)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len([query for query in context.captured_queries
+                    if query['sql'].startswith('UPDATE')]) == 1
+        assert [item['title'] for item in response.data] == [
+            kept.title, 'changed', 'renamed', 'new']
+        assert list(AdvertEstimate.objects.filter(advert=advert).order_by(
+            'title').values_list('title', 'amount')) == [
+            ('changed', 1), (kept.title, kept.amount), ('new', 2),
+            ('renamed', renamed.amount)]
+
+    def test_list_update_foreign_estimates(self, rf, profile, advert,
+                                           advert_estimates):
+        from django.contrib.auth import get_user_model
+
+        stranger = get_user_model().objects.create_user(
+            'stranger@example.com', 'pass')
+        request_data = EstimateListUpdateSerializer(advert_estimates,
+                                                    many=True).data
+        req = rf.post(
+            reverse('api:estimates-list-update'),
+            data=json.dumps(request_data),
+            content_type=JSON_TYPE
+        )
+        force_authenticate(req, stranger)
+        response = self.get_response_as_viewset({'post': 'list_update'}, req)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_list_update_requires_advert(self, rf, profile, advert):
+        req = rf.post(
+            reverse('api:estimates-list-update'),
+            data=json.dumps([{'title': 'new', 'amount': 2}]),
+            content_type=JSON_TYPE
+        )
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'post': 'list_update'}, req)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'advert' in response.data
+
+
+@pytest.mark.django_db
+class TestProjectFilter:
+
+    def test_collected_percent_filter(self, rf, advert, another_advert):
+        from cf_adverts.api.filters import ProjectFilter
+
+        Advert.objects.filter(pk=advert.pk).update(collected_amount=900)
+        Advert.objects.filter(pk=another_advert.pk).update(
+            collected_amount=100)
+        req = rf.get('/')
+
+        filter_set = ProjectFilter({'min_percent': 80},
+                                   queryset=Advert.objects.all(),
+                                   request=req)
+        assert [obj.id for obj in filter_set.qs] == [advert.id]
+
+        filter_set = ProjectFilter({'ordering': 'collected_percent'},
+                                   queryset=Advert.objects.all(),
+                                   request=req)
+        assert [obj.id for obj in filter_set.qs] == [another_advert.id,
+                                                     advert.id]
+
+
+@pytest.mark.django_db
+class TestEventsAPI(BaseTestViewSetMixin):
+    viewset = EventsViewSet
+
+    def test_events_cursor_pagination(self, rf, profile, advert):
+        from cf_adverts.models import Event
+
+        Event.objects.bulk_create([
+            Event(advert=advert, percent=percent,
+                  base_type=Event.TYPE_CHOICES.CUSTOM)
+            for percent in range(5)
+        ])
+        expected_ids = list(Event.objects.filter(advert=advert).order_by(
+            '-created', 'id').values_list('id', flat=True))
+
+        url = reverse('api:events-list') + \
+            '?advert={}&page_size=2&cursor='.format(advert.id)
+        received_ids = []
+        while url:
+            req = rf.get(url)
+            force_authenticate(req, profile.user)
+            response = self.get_response_as_viewset({'get': 'list'}, req)
+
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data['results']) <= 2
+            received_ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        assert received_ids == expected_ids
+
+    def test_events_page_pagination(self, rf, profile, advert):
+        from cf_adverts.models import Event
+
+        Event.objects.bulk_create([
+            Event(advert=advert, percent=percent,
+                  base_type=Event.TYPE_CHOICES.CUSTOM)
+            for percent in range(5)
+        ])
+        expected_ids = list(Event.objects.filter(advert=advert).values_list(
+            'id', flat=True))
+
+        url = reverse('api:events-list') + '?advert={}&page=1'.format(
+            advert.id)
+        received_ids = []
+        while url:
+            req = rf.get(url)
+            force_authenticate(req, profile.user)
+            response = self.get_response_as_viewset({'get': 'list'}, req)
+
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data['count'] == len(expected_ids)
+            assert (response.data['previous'] is None) == (not received_ids)
+            received_ids.extend(
+                item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        assert received_ids == expected_ids
+
+    def test_events_invalid_cursor(self, rf, profile, advert):
+        req = rf.get(reverse('api:events-list') + '?cursor=invalid')
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'get': 'list'}, req)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestAdvertSearch(BaseTestViewSetMixin):
+    viewset = AdvertViewSet
+
+    def test_search_table_parity(self, rf, profile, available_advert,
+                                 another_advert):
+        from cf_adverts.api.serializers import AdvertListDetailSerializer
+        from cf_adverts.models import PublishedAdvert, PublishedAdvertSearch
+
+        assert PublishedAdvertSearch.objects.rebuild() == 1
+
+        req = rf.get(reverse('api:adverts-search'))
+        force_authenticate(req, profile.user)
+        response = self.get_response_as_viewset({'get': 'search'}, req)
+
+        expected = AdvertListDetailSerializer(
+            PublishedAdvert.objects.all(), many=True,
+            context={'request': response.renderer_context['request']}
+        ).data
+        results = response.data.get('results', response.data)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(json.dumps(results)) == json.loads(
+            json.dumps(expected))
+
+    def test_search_cursor_pagination(self, rf, profile, available_advert,
+                                      another_advert):
+        from cf_adverts.models import PublishedAdvertSearch
+
+        another_advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+        another_advert.save()
+        PublishedAdvertSearch.objects.rebuild()
+        expected_ids = list(PublishedAdvertSearch.objects.order_by(
+            '-pk').values_list('pk', flat=True))
+
+        assert len(expected_ids) == 2
+
+        url = reverse('api:adverts-search') + '?cursor=&page_size=1&' \
+                                              'category={}'.format(
+            available_advert.category_id)
+        received_ids = []
+        while url:
+            req = rf.get(url)
+            response = self.get_response_as_viewset({'get': 'search'}, req)
+
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            received_ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        assert received_ids == expected_ids
+
+        req = rf.get(reverse('api:adverts-search'))
+        response = self.get_response_as_viewset({'get': 'search'}, req)
+
+        assert response.data['count'] == 2
+
+    def test_search_cache_pagination_modes(self, rf, available_advert):
+        from cf_adverts.models import PublishedAdvertSearch
+
+        PublishedAdvertSearch.objects.rebuild()
+        url = reverse('api:adverts-search')
+
+        cursor_response = self.get_response_as_viewset(
+            {'get': 'search'}, rf.get(url + '?cursor='))
+        page_response = self.get_response_as_viewset(
+            {'get': 'search'}, rf.get(url))
+        cached_cursor_response = self.get_response_as_viewset(
+            {'get': 'search'}, rf.get(url + '?cursor='))
+
+        assert 'count' not in cursor_response.data
+        assert page_response.data['count'] == 1
+        assert 'count' not in cached_cursor_response.data
+
+    def test_search_moderation_filters(self, rf, profile, available_advert):
+        from cf_adverts.models import PublishedAdvertSearch
+
+        PublishedAdvertSearch.objects.rebuild()
+        test_data = (
+            ({'is_available': 'true'}, [available_advert.id]),
+            ({'is_available': 'false'}, []),
+            ({'is_draft': 'false'}, [available_advert.id]),
+            ({'is_draft': 'true'}, []),
+            ({'base_type': 'CUSTOM'}, []),
+        )
+        for params, expected_ids in test_data:
+            req = rf.get(reverse('api:adverts-search'), params)
+            response = self.get_response_as_viewset({'get': 'search'}, req)
+            results = response.data.get('results', response.data)
+
+            assert response.status_code == status.HTTP_200_OK
+            assert [item['id'] for item in results] == expected_ids
+
+    def test_search_table_refresh(self, profile, available_advert):
+        from cf_adverts.models import PublishedAdvertSearch
+
+        PublishedAdvertSearch.objects.refresh([available_advert.id])
+        entry = PublishedAdvertSearch.objects.get(pk=available_advert.id)
+
+        assert entry.title == available_advert.title
+
+        available_advert.is_available = False
+        available_advert.save()
+        PublishedAdvertSearch.objects.refresh([available_advert.id])
+
+        assert not PublishedAdvertSearch.objects.exists()
+
+
+@pytest.mark.django_db
+class TestQueryBudget(BaseTestViewSetMixin):
+    """
+    Number of queries per action should not depend on related rows.
+    """
+
+    viewset = AdvertViewSet
+
+    def assert_queries(self, viewset, actions, req, budget, **kwargs):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.viewset = viewset
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_response_as_viewset(actions, req, **kwargs)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(context.captured_queries) <= budget, '\n'.join(
+            query['sql'] for query in context.captured_queries)
+        return response
+
+    def test_detail_queries(self, rf, profile, advert, advert_estimates):
+        req = rf.get(reverse('api:adverts-detail', args=[advert.id]))
+        force_authenticate(req, user=profile.user)
+        response = self.assert_queries(AdvertViewSet, {'get': 'retrieve'},
+                                       req, 4, pk=advert.id)
+
+        assert len(response.data['estimates']) == len(advert_estimates)
+        assert response.data['has_draft'] is False
+        assert response.data['perms'] == {
+            'can_manage_content': False,
+            'can_manage_roles': True
+        }
+
+    def test_detail_draft_queries(self, rf, profile, available_advert,
+                                  advert_estimates):
+        draft = available_advert.get_or_create_draft()
+        draft.process_status = Advert.MODERATE_PROCESS_TYPES.DONE
+        draft.save()
+
+        req = rf.get(reverse('api:adverts-detail',
+                             args=[available_advert.id]))
+        force_authenticate(req, user=profile.user)
+        response = self.assert_queries(AdvertViewSet, {'get': 'retrieve'},
+                                       req, 4, pk=available_advert.id)
+
+        assert response.data['id'] == draft.id
+        assert len(response.data['estimates']) == len(advert_estimates)
+
+    def test_detail_not_modified_queries(self, rf, profile, advert,
+                                         advert_estimates):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('api:adverts-detail', args=[advert.id])
+        req = rf.get(url)
+        force_authenticate(req, user=profile.user)
+        etag = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                            pk=advert.id)['ETag']
+
+        req = rf.get(url, HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(req, user=profile.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_response_as_viewset({'get': 'retrieve'}, req,
+                                                    pk=advert.id)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(context.captured_queries) <= 3
+        assert not any(
+            query['sql'].startswith('SELECT "cf_adverts_advertestimate"."id"')
+            for query in context.captured_queries)
+
+    def test_update_without_preconditions(self, rf, profile, advert):
+        url = reverse('api:adverts-detail', args=[advert.id])
+        req = rf.patch(url, data=json.dumps({'title': 'new title'}),
+                       content_type=JSON_TYPE)
+        force_authenticate(req, user=profile.user)
+        with mock.patch.object(AdvertViewSet, 'get_validators',
+                               return_value=('"etag"', None)) as validators:
+            response = self.get_response_as_viewset(
+                {'patch': 'partial_update'}, req, pk=advert.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        # validators of response only
+        assert validators.call_count == 1
+
+    def test_list_queries(self, rf, profile, advert, another_advert):
+        req = rf.get(reverse('api:adverts-list'))
+        force_authenticate(req, user=profile.user)
+        response = self.assert_queries(AdvertViewSet, {'get': 'list'}, req, 3)
+
+        assert all(row['perms']['can_manage_roles']
+                   for row in response.data.get('results', response.data))
+
+    def test_search_queries(self, rf, profile, available_advert):
+        from cf_adverts.models import PublishedAdvertSearch
+
+        PublishedAdvertSearch.objects.rebuild()
+        req = rf.get(reverse('api:adverts-search'))
+        force_authenticate(req, user=profile.user)
+        self.assert_queries(AdvertViewSet, {'get': 'search'}, req, 2)
+
+    def test_events_queries(self, rf, profile, advert):
+        from cf_adverts.models import Event
+
+        Event.objects.bulk_create([
+            Event(advert=advert, percent=percent,
+                  base_type=Event.TYPE_CHOICES.CUSTOM)
+            for percent in range(5)
+        ])
+        req = rf.get(reverse('api:events-list') + '?advert={}&cursor='.format(
+            advert.id))
+        force_authenticate(req, user=profile.user)
+        # advert filter value is validated by one query
+        self.assert_queries(EventsViewSet, {'get': 'list'}, req, 2)
+
+
+@pytest.mark.django_db
+class TestAdvertValuesSerializer:
+
+    def assert_parity(self, serializer_class, queryset, context):
+        from cf_adverts.api.serializers import AdvertValuesSerializer
+
+        expected = serializer_class(queryset, many=True, context=context).data
+        rows = queryset.values(
+            *AdvertValuesSerializer.get_columns(serializer_class))
+        data = AdvertValuesSerializer(rows, serializer_class=serializer_class,
+                                      context=context).data
+
+        assert json.dumps(data) == json.dumps(expected)
+
+    def test_list_parity(self, rf, advert, another_advert, available_advert):
+        from django.utils import timezone
+        from cf_adverts.api.serializers import (
+            AdvertListDetailSerializer, ProjectShortSerializer
+        )
+
+        Advert.objects.filter(pk=advert.pk).update(
+            collected_amount=333,
+            ended_at=timezone.now().date() + timezone.timedelta(days=10),
+            small_logo='adverts/logo.png'
+        )
+        available_advert.get_or_create_draft()
+        queryset = Advert.objects.with_draft_flags().order_by('pk')
+
+        for context in ({}, {'request': rf.get('/')}):
+            self.assert_parity(AdvertListDetailSerializer, queryset, context)
+        self.assert_parity(ProjectShortSerializer,
+                           queryset.filter(small_logo=''), {})
+
+    def test_logo_parity(self, rf, advert, picture):
+        from cf_adverts.api.serializers import (
+            AdvertListDetailSerializer, ProjectShortSerializer
+        )
+
+        advert.small_logo.save(picture.name, picture)
+        queryset = Advert.objects.with_draft_flags().filter(pk=advert.pk)
+
+        for context in ({}, {'request': rf.get('/')}):
+            self.assert_parity(AdvertListDetailSerializer, queryset, context)
+        self.assert_parity(ProjectShortSerializer, queryset, {})
+
+    def test_owner_list_parity(self, rf, advert, another_advert, user):
+        from cf_adverts.api.serializers import AdvertOwnerListSerializer
+
+        req = rf.get('/')
+        req.user = user
+        queryset = Advert.objects.order_by('pk')
+
+        self.assert_parity(AdvertOwnerListSerializer, queryset,
+                           {'request': req})
+
+    def test_search_parity(self, rf, profile, available_advert, picture):
+        from cf_adverts.api.serializers import PublishedAdvertSearchSerializer
+        from cf_adverts.models import PublishedAdvertSearch
+
+        available_advert.small_logo.save(picture.name, picture)
+        assert PublishedAdvertSearch.objects.rebuild() == 1
+        self.assert_parity(PublishedAdvertSearchSerializer,
+                           PublishedAdvertSearch.objects.all(),
+                           {'request': rf.get('/')})
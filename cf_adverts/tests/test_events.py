@@ -0,0 +1,233 @@
+import mock
+import pytest
+from django.db import transaction
+from django.utils import timezone
+
+from cf_adverts.events import EventBuffer
+from cf_adverts.models import (
+    Advert, ArchivedEvent, Event, EventDailyRollup
+)
+from cf_adverts.retention import (
+    EventRetentionPolicy, archive_events, compact_events,
+    process_events_retention
+)
+from cf_adverts.tasks import create_events, rebuild_event_rollups
+
+
+@pytest.mark.django_db
+class TestEventBuffer:
+
+    def test_flush_on_exit(self, advert):
+        Event.objects.all().delete()
+        event_buffer = EventBuffer(max_size=100)
+
+        with event_buffer:
+            for percent in range(3):
+                event_buffer.add(advert=advert, percent=percent,
+                                 base_type=Event.TYPE_CHOICES.CUSTOM)
+            assert not Event.objects.exists()
+
+        assert Event.objects.count() == 3
+
+    def test_flush_on_size(self, advert):
+        Event.objects.all().delete()
+        event_buffer = EventBuffer(max_size=2)
+
+        with event_buffer:
+            for percent in range(3):
+                event_buffer.add(advert=advert, percent=percent,
+                                 base_type=Event.TYPE_CHOICES.CUSTOM)
+            assert Event.objects.count() == 2
+
+        assert Event.objects.count() == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_event_buffer_flush_on_commit(advert):
+    Event.objects.all().delete()
+    event_buffer = EventBuffer(max_size=100)
+
+    with transaction.atomic():
+        for percent in range(3):
+            event_buffer.add(advert=advert, percent=percent,
+                             base_type=Event.TYPE_CHOICES.CUSTOM)
+        assert not Event.objects.exists()
+
+    assert Event.objects.count() == 3
+
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            event_buffer.add(advert=advert, percent=0,
+                             base_type=Event.TYPE_CHOICES.CUSTOM)
+            raise ValueError
+
+    event_buffer.flush()
+
+    assert Event.objects.count() == 3
+
+
+@pytest.mark.django_db
+class TestEventsRetention:
+
+    def create_event(self, advert, base_type, minutes):
+        event = Event.objects.create(advert=advert, base_type=base_type,
+                                     percent=minutes)
+        Event.objects.filter(pk=event.pk).update(
+            created=timezone.now() - timezone.timedelta(minutes=minutes))
+        return event
+
+    def test_compact_events(self, advert):
+        Event.objects.all().delete()
+        edited = Event.TYPE_CHOICES.PROJECT_EDITED
+        events = [
+            self.create_event(advert, edited, 30),
+            self.create_event(advert, edited, 29),
+            self.create_event(advert, edited, 28),
+            self.create_event(advert, Event.TYPE_CHOICES.CUSTOM, 27),
+            self.create_event(advert, edited, 26),
+            self.create_event(advert, edited, 10),
+        ]
+        policy = EventRetentionPolicy(compact_window=120)
+
+        assert compact_events(policy, dry_run=True) == 2
+        assert Event.objects.count() == len(events)
+
+        assert compact_events(policy) == 2
+        assert set(Event.objects.values_list('id', flat=True)) == {
+            event.id for event in events[2:]
+        }
+
+    def test_compact_events_scan_window(self, advert):
+        Event.objects.all().delete()
+        edited = Event.TYPE_CHOICES.PROJECT_EDITED
+        old_events = [self.create_event(advert, edited, 60 * 24 * 3 + 1),
+                      self.create_event(advert, edited, 60 * 24 * 3)]
+        recent_events = [self.create_event(advert, edited, 2),
+                         self.create_event(advert, edited, 1)]
+        policy = EventRetentionPolicy(compact_window=120,
+                                      compact_scan_days=1)
+
+        assert compact_events(policy) == 1
+        assert set(Event.objects.values_list('id', flat=True)) == {
+            event.id for event in old_events + recent_events[1:]
+        }
+
+    def test_archive_events(self, advert, another_advert):
+        Event.objects.all().delete()
+        Advert.objects.filter(pk=advert.pk).update(
+            ended_at=timezone.now().date() - timezone.timedelta(days=1))
+        old_event = self.create_event(advert, Event.TYPE_CHOICES.CUSTOM,
+                                      60 * 24 * 10)
+        self.create_event(advert, Event.TYPE_CHOICES.CUSTOM, 10)
+        self.create_event(another_advert, Event.TYPE_CHOICES.CUSTOM,
+                          60 * 24 * 10)
+        policy = EventRetentionPolicy(archive_after_days=5, chunk_size=1)
+
+        assert archive_events(policy, dry_run=True) == 1
+        assert not ArchivedEvent.objects.exists()
+
+        assert archive_events(policy) == 1
+        assert list(ArchivedEvent.objects.values_list('id', flat=True)) == [
+            old_event.id]
+        assert Event.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_event_buffer_celery_mode(advert):
+    Event.objects.all().delete()
+    event_buffer = EventBuffer(max_size=100, use_celery=True)
+
+    with mock.patch('cf_adverts.tasks.create_events.apply_async') as mocked:
+        with transaction.atomic():
+            for percent in range(3):
+                event_buffer.add(advert=advert, percent=percent,
+                                 base_type=Event.TYPE_CHOICES.CUSTOM)
+            assert not mocked.called
+
+    assert not Event.objects.exists()
+    assert mocked.call_count == 1
+
+    payloads = mocked.call_args[1]['args'][0]
+    assert [payload['percent'] for payload in payloads] == [0, 1, 2]
+
+    create_events(payloads)
+
+    assert list(Event.objects.order_by('created').values_list(
+        'percent', flat=True)) == [0, 1, 2]
+
+
+@pytest.mark.django_db
+class TestEventDailyRollup:
+
+    def test_add_events(self, advert):
+        EventDailyRollup.objects.all().delete()
+        now = timezone.now()
+        events = [
+            Event(advert=advert, base_type=Event.TYPE_CHOICES.PERCENT_CHANGED,
+                  percent=10, created=now),
+            Event(advert=advert, base_type=Event.TYPE_CHOICES.PERCENT_CHANGED,
+                  percent=20, created=now + timezone.timedelta(seconds=1)),
+            Event(advert=advert, base_type=Event.TYPE_CHOICES.PROJECT_EDITED,
+                  percent=20, created=now + timezone.timedelta(seconds=2)),
+        ]
+
+        EventDailyRollup.objects.add_events(events[:1])
+        EventDailyRollup.objects.add_events(events[1:])
+
+        rollup = EventDailyRollup.objects.get(advert=advert)
+
+        assert rollup.percent_changed_count == 2
+        assert rollup.project_edited_count == 1
+        assert rollup.payment_received_count == 0
+        assert rollup.max_percent == 20
+        assert rollup.first_event_at == events[0].created
+        assert rollup.last_event_at == events[-1].created
+
+    def test_rebuild(self, advert):
+        Event.objects.all().delete()
+        for percent in range(3):
+            Event.objects.create(advert=advert, percent=percent,
+                                 base_type=Event.TYPE_CHOICES.CUSTOM)
+        EventDailyRollup.objects.all().delete()
+
+        assert EventDailyRollup.objects.rebuild(Event.objects.all()) == 1
+
+        rollup = EventDailyRollup.objects.get(advert=advert)
+
+        assert rollup.custom_count == 3
+        assert rollup.max_percent == 2
+
+    def test_rebuild_after_retention(self, advert):
+        Event.objects.all().delete()
+        EventDailyRollup.objects.all().delete()
+        Advert.objects.filter(pk=advert.pk).update(
+            ended_at=timezone.now().date() - timezone.timedelta(days=1))
+        base = timezone.localtime(timezone.now()).replace(
+            hour=12, minute=0) - timezone.timedelta(days=2)
+        old_created = base - timezone.timedelta(days=10)
+        events = [
+            (Event.TYPE_CHOICES.CUSTOM, old_created),
+            (Event.TYPE_CHOICES.PROJECT_EDITED, base),
+            (Event.TYPE_CHOICES.PROJECT_EDITED,
+             base + timezone.timedelta(minutes=1)),
+            (Event.TYPE_CHOICES.PROJECT_EDITED,
+             base + timezone.timedelta(minutes=2)),
+        ]
+        for base_type, created in events:
+            event = Event.objects.create(advert=advert, base_type=base_type,
+                                         percent=0)
+            Event.objects.filter(pk=event.pk).update(created=created)
+        EventDailyRollup.objects.add_events(Event.objects.all())
+
+        report = process_events_retention(EventRetentionPolicy(
+            compact_window=120, archive_after_days=5))
+
+        assert report['compacted'] == 2
+        assert report['archived'] == 1
+
+        rebuild_event_rollups()
+        rollups = {rollup.date: rollup
+                   for rollup in EventDailyRollup.objects.filter(advert=advert)}
+
+        assert rollups[old_created.date()].custom_count == 1
+        assert rollups[base.date()].project_edited_count == 3
@@ -61,3 +61,423 @@ class TestProjectModel:
 
         for key in values_data.keys():
             assert getattr(available_advert, key) == getattr(draft, key)
+
+    def test_dirty_fields_tracking(self, advert):
+        assert advert.get_dirty_fields() == {}
+
+        advert.title = 'changed title'
+
+        assert advert.get_dirty_fields() == {'title': 'test title'}
+
+        advert.save()
+
+        assert advert.get_dirty_fields() == {}
+
+    def test_dirty_fields_normalized(self, advert):
+        from django.utils import timezone
+
+        now = timezone.localtime(timezone.now())
+        advert.ended_at = now.date()
+        advert.save()
+        advert.refresh_from_db()
+        advert.ended_at = now
+        advert.total_amount = str(advert.total_amount)
+
+        assert advert.get_dirty_fields() == {}
+
+    def test_save_updates_only_changed_columns(self, advert):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        advert.title = 'changed title'
+        with CaptureQueriesContext(connection) as context:
+            advert.save()
+
+        assert len(context.captured_queries) == 1
+        sql = context.captured_queries[0]['sql']
+        assert sql.startswith('UPDATE')
+        assert '"title"' in sql
+        assert '"description"' not in sql
+
+    def test_save_without_changes(self, advert):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as context:
+            advert.save()
+
+        assert len(context.captured_queries) == 0
+
+    def test_dirty_file_with_same_name(self, advert, picture):
+        from django.core.files.base import ContentFile
+
+        advert.small_logo.save(picture.name, picture)
+        advert.refresh_from_db()
+
+        assert advert.get_dirty_fields() == {}
+
+        advert.small_logo = ContentFile(b'new content',
+                                        name=advert.small_logo.name)
+
+        assert 'small_logo' in advert.get_dirty_fields()
+
+        advert.save()
+        advert.refresh_from_db()
+        advert.small_logo.open()
+
+        assert advert.small_logo.read() == b'new content'
+
+    def test_ended_at_extended_on_publish(self, advert):
+        assert advert.ended_at is None
+
+        advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+        advert.save()
+        advert.refresh_from_db()
+
+        assert advert.ended_at is not None
+
+    def test_status_change_signal(self, advert, final_status):
+        with mock.patch('cf_adverts.models.advert.project_status_changed.send'
+                        ) as mocked_send:
+            advert.title = 'changed title'
+            advert.save()
+            assert not mocked_send.called
+
+            advert.status = final_status
+            advert.save()
+            assert mocked_send.call_count == 1
+
+    def test_moderation_state_annotation(self, profile, advert,
+                                         another_advert):
+        from cf_adverts.managers import MODERATION_STATE_CHOICES
+
+        another_advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+        another_advert.save()
+        draft = another_advert.get_or_create_draft()
+
+        states = dict(
+            Advert.objects.with_moderation_state().values_list(
+                'id', 'moderation_state')
+        )
+
+        assert states[advert.id] == MODERATION_STATE_CHOICES.NEW
+        assert states[another_advert.id] == ''
+        assert states[draft.id] == MODERATION_STATE_CHOICES.DRAFT
+
+        Advert.objects.filter(pk=advert.pk).update(is_available=False)
+        state = Advert.objects.with_moderation_state().filter(
+            pk=advert.pk).values_list('moderation_state', flat=True).get()
+
+        assert state == MODERATION_STATE_CHOICES.BANNED
+
+    def test_create_draft_copies_estimates(self, available_advert,
+                                           advert_estimates):
+        draft = available_advert.get_or_create_draft()
+
+        assert list(draft.estimates.order_by('id').values_list(
+            'title', 'amount')) == [
+            (estimate.title, estimate.amount)
+            for estimate in advert_estimates
+        ]
+        assert available_advert.estimates.count() == len(advert_estimates)
+
+    def test_draft_copy_fields(self):
+        copy_fields = DraftAdvert.get_draft_copy_fields()
+
+        assert copy_fields is DraftAdvert.get_draft_copy_fields()
+        assert 'category_id' in copy_fields
+        assert 'title' in copy_fields
+        for field_name in DraftAdvert.exclude_fields:
+            assert field_name not in copy_fields
+
+    def test_draft_applying_estimates(self, available_advert,
+                                      advert_estimates):
+        draft = available_advert.get_or_create_draft()
+        draft_estimates = list(draft.estimates.order_by('id'))
+        draft_estimates[1].amount = 999
+        draft_estimates[1].save()
+        draft_estimates[-1].delete()
+
+        draft.apply_draft_to_origin()
+
+        estimates = list(available_advert.estimates.order_by('id'))
+
+        assert [estimate.id for estimate in estimates] == [
+            estimate.id for estimate in advert_estimates[:-1]
+        ]
+        assert [estimate.amount for estimate in estimates] == [100, 999, 102]
+
+    def test_draft_applying_without_changes(self, available_advert,
+                                            advert_estimates):
+        draft = available_advert.get_or_create_draft()
+
+        with mock.patch.object(Advert, 'send_edit_signal') as mocked_signal:
+            draft.apply_draft_to_origin()
+
+        assert not mocked_signal.called
+        assert available_advert.estimates.count() == len(advert_estimates)
+
+    def test_has_draft_annotation(self, available_advert, another_advert):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        draft = available_advert.get_or_create_draft()
+        adverts = list(Advert.objects.with_draft_flags().order_by('id'))
+
+        with CaptureQueriesContext(connection) as context:
+            flags = {advert.id: advert.has_draft() for advert in adverts}
+
+        assert len(context.captured_queries) == 0
+        assert flags == {
+            available_advert.id: True,
+            another_advert.id: False,
+            draft.id: False
+        }
+        assert available_advert.has_draft()
+        assert not another_advert.has_draft()
+
+    def create_role_user(self, advert, email, **flags):
+        from django.contrib.auth import get_user_model
+
+        roles_field = Advert._meta.get_field('roles').field
+        role_model = roles_field.model
+        user = get_user_model().objects.create_user(email, 'pass')
+        role_model.objects.create(**dict({
+            roles_field.name: advert,
+            'user': user,
+            'base_type': role_model.TYPE_CHOICES.STAFF,
+            'is_active': True,
+            'is_available': Advert.MODERATE_STATUS_CHOICES.ALLOWED,
+            'can_manage_roles': False,
+            'can_manage_content': False,
+        }, **flags))
+        return user
+
+    def test_perms_method(self, advert):
+        editor = self.create_role_user(advert, 'editor@example.com',
+                                       can_manage_content=True)
+        manager = self.create_role_user(advert, 'manager@example.com',
+                                        can_manage_roles=True)
+        viewer = self.create_role_user(advert, 'viewer@example.com')
+
+        assert advert.perms(editor) == {
+            'can_manage_content': True,
+            'can_manage_roles': False
+        }
+        assert advert.perms(manager) == {
+            'can_manage_content': False,
+            'can_manage_roles': True
+        }
+        assert advert.perms(viewer) == {
+            'can_manage_content': False,
+            'can_manage_roles': False
+        }
+
+    def test_perms_method_staff(self, advert, user):
+        user.is_staff = True
+
+        assert advert.perms(user) == {
+            'can_manage_content': True,
+            'can_manage_roles': True
+        }
+
+    def test_prefetched_permissions(self, advert, another_advert, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as context:
+            Advert.prefetch_permissions([advert, another_advert], user)
+            flags = [advert.get_role_permissions(user),
+                     another_advert.get_role_permissions(user)]
+
+        assert len(context.captured_queries) == 1
+        assert flags == [
+            {'can_manage_roles': False, 'can_manage_content': False}
+        ] * 2
+
+    def test_collected_percent_annotation(self, advert):
+        test_data = (
+            (1000, 0, 0),
+            (1000, 333, 33),
+            (1000, 999, 99),
+            (1000, 1500, 150),
+            (0, 100, 0),
+            (0, 0, 0),
+        )
+        for total_amount, collected_amount, expected in test_data:
+            advert.total_amount = total_amount
+            advert.collected_amount = collected_amount
+            advert.save()
+
+            annotated = Advert.objects.with_collected_percent().get(
+                pk=advert.pk)
+
+            assert advert.get_collected_percent() == expected
+            assert annotated.collected_percent == expected
+
+    def test_bulk_create_adverts(self, profile, start_status, category,
+                                 location):
+        from django.db import connection, models
+        from django.test.utils import CaptureQueriesContext
+        from cf_adverts.managers import ProjectQuerySet
+
+        def bulk_create(queryset, objs, batch_size=None):
+            # emulate database returning ids of inserted rows
+            with mock.patch.object(connection.features,
+                                   'can_return_ids_from_bulk_insert', False):
+                models.QuerySet.bulk_create(queryset, objs, batch_size)
+            ids = Advert.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:len(objs)]
+            for obj, pk in zip(objs, reversed(list(ids))):
+                obj.pk = pk
+                obj._state.adding = False
+            return objs
+
+        adverts = [
+            Advert(title='bulk {}'.format(index), owner=profile.user,
+                   status=start_status, category=category, location=location,
+                   total_amount=100)
+            for index in range(3)
+        ]
+        with mock.patch.object(connection.features,
+                               'can_return_ids_from_bulk_insert', True), \
+                mock.patch.object(ProjectQuerySet, 'bulk_create',
+                                  bulk_create), \
+                CaptureQueriesContext(connection) as context:
+            Advert.objects.bulk_create_adverts(adverts)
+
+        advert_inserts = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('INSERT INTO "{}"'.format(
+                Advert._meta.db_table))
+        ]
+        assert len(advert_inserts) == 1
+        assert list(Advert.objects.filter(
+            pk__in=[advert.pk for advert in adverts]
+        ).order_by('pk').values_list(
+            'title', 'owner_id', 'owner_profile_type')) == [
+            ('bulk {}'.format(index), profile.user.id, profile.base_type)
+            for index in range(3)
+        ]
+        assert sorted(Event.objects.filter(
+            base_type=Event.TYPE_CHOICES.PROJECT_CREATED
+        ).values_list('advert_id', flat=True)) == sorted(
+            advert.pk for advert in adverts)
+        for advert in adverts:
+            assert advert.get_loaded_value('id') == advert.pk
+            assert advert.get_dirty_fields() == {}
+
+    def test_apply_payments(self, advert, another_advert):
+        result = Advert.objects.apply_payments([
+            (advert.id, 100),
+            (another_advert.id, 500),
+            (advert.id, 150),
+            (another_advert.id, 0),
+        ])
+
+        assert result == {
+            advert.id: (0, 25),
+            another_advert.id: (0, 49),
+        }
+
+        percents = advert.add_collected_amount(800)
+
+        assert percents == (25, 105)
+        assert advert.collected_amount == 1050
+        assert not advert.get_dirty_fields()
+
+    def test_owner_profile_type_sync(self, user, advert):
+        from cf_adverts.models import PublishedAdvert
+        from cf_users.models import Profile
+
+        user.profile.base_type = Profile.TYPE_CHOICES.NCO
+        user.profile.save()
+        advert.refresh_from_db()
+
+        assert advert.owner_profile_type == Profile.TYPE_CHOICES.NCO
+
+        another_advert = Advert.objects.create(
+            title='new advert',
+            status=advert.status,
+            category=advert.category,
+            owner=user
+        )
+
+        assert another_advert.owner_profile_type == Profile.TYPE_CHOICES.NCO
+        assert 'cf_users_profile' not in str(
+            PublishedAdvert.objects.all().query)
+
+
+def get_query_plan(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql, params)
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(str(row) for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+class TestProjectQueryPlans:
+
+    def create_other_adverts(self, advert, count=500):
+        """
+        Fill table with allowed adverts of other profile type
+        and their drafts, so indexes are selective for queries
+        of managers.
+        """
+
+        from django.db import connection
+        from cf_users.models import Profile
+
+        profile_type = next(value for value, name in Profile.TYPE_CHOICES
+                            if value != Profile.TYPE_CHOICES.NCO)
+        Advert.objects.bulk_create([
+            Advert(title='other advert {}'.format(i),
+                   status=advert.status,
+                   short_description='other description',
+                   category_id=advert.category_id,
+                   location_id=advert.location_id,
+                   total_amount=1000,
+                   owner_id=advert.owner_id,
+                   owner_profile_type=profile_type,
+                   is_available=Advert.MODERATE_STATUS_CHOICES.ALLOWED)
+            for i in range(count)
+        ])
+        origin_ids = Advert.objects.filter(
+            owner_profile_type=profile_type).values_list('pk', flat=True)
+        Advert.objects.bulk_create([
+            Advert(title='other draft',
+                   status=advert.status,
+                   short_description='other description',
+                   category_id=advert.category_id,
+                   location_id=advert.location_id,
+                   total_amount=1000,
+                   owner_id=advert.owner_id,
+                   owner_profile_type=profile_type,
+                   origin_id=origin_id)
+            for origin_id in list(origin_ids)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE ' + Advert._meta.db_table)
+
+    def test_managers_use_indexes(self, advert):
+        from cf_adverts.models import (
+            BannedAdvert, NewAdvert, PublishedAdvert
+        )
+
+        self.create_other_adverts(advert)
+        querysets = [
+            (PublishedAdvert.objects.all(), 'cf_adverts_advert_owner_type'),
+            (NewAdvert.objects.all(), 'cf_adverts_advert_owner_type'),
+            (BannedAdvert.objects.all(), 'cf_adverts_advert_moderation'),
+            (DraftAdvert.objects.all(), 'cf_adverts_advert_owner_type'),
+        ]
+        index_names = [index.name for index in Advert._meta.indexes]
+        for queryset, index_name in querysets:
+            assert index_name in index_names
+            plan = get_query_plan(queryset)
+            assert index_name in plan, plan
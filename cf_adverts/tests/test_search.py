@@ -0,0 +1,191 @@
+import mock
+import pytest
+from django.urls import reverse
+from rest_framework.test import force_authenticate
+
+from cf_adverts import search
+from cf_adverts.api.views import AdvertViewSet
+from cf_adverts.models import Advert, PublishedAdvertSearch
+
+
+class TestSearchTerms:
+
+    def test_tokenize(self):
+        assert search.tokenize('Фонд помощи и Ёлки, the 2017 trees') == [
+            'фонд', 'помощи', 'елки', 'trees'
+        ]
+
+    def test_stem(self):
+        assert search.stem('животным') == search.stem('животные')
+        assert search.stem('собаками') == search.stem('собака')
+        assert search.stem('shelters') == search.stem('shelter')
+        assert search.stem('helping') == search.stem('helps')
+
+    def test_document_terms(self):
+        advert = type('SomeCls', (), {
+            'title': 'Shelter',
+            'short_description': 'shelters for dogs',
+            'description': 'dog'
+        })()
+
+        assert search.get_document_terms(advert) == {
+            search.stem('shelter'): 7,
+            search.stem('dogs'): 3
+        }
+
+
+@pytest.mark.django_db
+class TestAdvertTextSearch:
+
+    def publish(self, advert, **kwargs):
+        for key, value in kwargs.items():
+            setattr(advert, key, value)
+        advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+        advert.save()
+
+    def test_search_query(self, rf, profile, advert, another_advert):
+        self.publish(advert, title='Приют для собак',
+                     short_description='помощь животным')
+        self.publish(another_advert, title='Школа',
+                     short_description='книги для приюта')
+        PublishedAdvertSearch.objects.rebuild()
+
+        test_data = (
+            ('приюты', [advert.id, another_advert.id]),
+            ('собаки приют', [advert.id]),
+            ('живот', [advert.id]),
+            ('книга', [another_advert.id]),
+            ('космос', []),
+        )
+        for query, expected_ids in test_data:
+            req = rf.get(reverse('api:adverts-search'), {'q': query})
+            force_authenticate(req, profile.user)
+            response = AdvertViewSet.as_view({'get': 'search'})(request=req)
+            results = response.data.get('results', response.data)
+
+            assert [item['id'] for item in results] == expected_ids
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSearchTableRefresh:
+
+    def test_refresh_on_commit(self, profile, advert):
+        from django.db import transaction
+
+        with transaction.atomic():
+            advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+            advert.save()
+            assert not PublishedAdvertSearch.objects.exists()
+
+        entry = PublishedAdvertSearch.objects.get()
+        assert entry.advert_id == advert.id
+        assert entry.terms.exists()
+
+        with transaction.atomic():
+            advert.is_available = False
+            advert.save()
+
+        assert not PublishedAdvertSearch.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSearchResponseCache:
+
+    @pytest.fixture
+    def search_cache(self):
+        from django.core.cache import caches
+        from cf_adverts.search_cache import SearchResponseCache
+
+        cache = SearchResponseCache(timeout=60)
+        caches[cache.alias].clear()
+        return cache
+
+    def get_request(self, rf, **params):
+        from rest_framework.request import Request
+
+        return Request(rf.get(reverse('api:adverts-search'), params))
+
+    def test_cache_hits(self, rf, search_cache):
+        build = mock.Mock(return_value={'results': []})
+
+        for params in ({'category': '1'}, {'category': '1', 'page': '1'}):
+            data = search_cache.get_or_build(self.get_request(rf, **params),
+                                             build)
+            assert data == {'results': []}
+
+        assert build.call_count == 1
+        assert search_cache.get_stats() == {
+            'hits': 1, 'misses': 1, 'hit_ratio': 0.5
+        }
+
+        search_cache.get_or_build(self.get_request(rf, owned='true'), build)
+
+        assert build.call_count == 2
+
+    def test_cache_invalidation(self, rf, search_cache):
+        build = mock.Mock(return_value={'results': []})
+        request = self.get_request(rf)
+
+        search_cache.get_or_build(request, build)
+        search_cache.bump_generation()
+        search_cache.get_or_build(request, build)
+
+        assert build.call_count == 2
+
+    def test_invalidated_by_published_adverts(self, advert):
+        from cf_users.models import Profile
+        from cf_adverts.search_cache import search_cache
+
+        advert.owner_profile_type = Profile.TYPE_CHOICES.NCO
+        Advert.objects.filter(pk=advert.pk).update(
+            owner_profile_type=advert.owner_profile_type)
+        advert.refresh_from_db()
+
+        with mock.patch.object(search_cache, 'invalidate') as invalidate:
+            advert.title = 'not published'
+            advert.save()
+            assert invalidate.call_count == 0
+
+            advert.is_available = Advert.MODERATE_STATUS_CHOICES.ALLOWED
+            advert.save()
+            assert invalidate.call_count == 1
+
+            advert.title = 'published'
+            advert.save()
+            assert invalidate.call_count == 2
+
+            advert.is_available = False
+            advert.save()
+            assert invalidate.call_count == 3
+
+            advert.title = 'banned'
+            advert.save()
+            assert invalidate.call_count == 3
+
+    def test_signals_invalidate_published_adverts(self, advert):
+        from cf_users.models import Profile
+        from cf_adverts.search_cache import search_cache
+        from cf_adverts.signals import project_edited, project_status_changed
+
+        Advert.objects.filter(pk=advert.pk).update(
+            owner_profile_type=Profile.TYPE_CHOICES.NCO)
+        advert.refresh_from_db()
+        draft = Advert(origin=advert, title='draft',
+                       owner_profile_type=Profile.TYPE_CHOICES.NCO,
+                       is_available=Advert.MODERATE_STATUS_CHOICES.ALLOWED)
+
+        for signal in (project_edited, project_status_changed):
+            receivers = signal._live_receivers(advert)
+            assert PublishedAdvertSearch.invalidate_cache in receivers
+            assert search_cache.invalidate not in receivers
+
+        with mock.patch.object(search_cache, 'invalidate') as invalidate:
+            PublishedAdvertSearch.invalidate_cache(sender=advert)
+            PublishedAdvertSearch.invalidate_cache(sender=draft)
+            assert invalidate.call_count == 0
+
+            Advert.objects.filter(pk=advert.pk).update(
+                is_available=Advert.MODERATE_STATUS_CHOICES.ALLOWED)
+            advert.refresh_from_db()
+            PublishedAdvertSearch.invalidate_cache(sender=advert)
+            assert invalidate.call_count == 1
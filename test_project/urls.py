@@ -4,11 +4,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 
 from cf_core.router import router
-from cf_adverts.api.views import AdvertViewSet, EstimateViewSet, EventsViewSet
+from cf_adverts.api.views import (
+    AdvertViewSet, EstimateViewSet, EventsViewSet, EventRollupsViewSet
+)
 
 router.register('adverts', AdvertViewSet, base_name='adverts')
 router.register('estimates', EstimateViewSet, base_name='estimates')
 router.register('events', EventsViewSet, base_name='events')
+router.register('event-rollups', EventRollupsViewSet,
+                base_name='event-rollups')
 
 
 urlpatterns = [